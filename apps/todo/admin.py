@@ -1,13 +1,98 @@
+from functools import partial
+
 from django.contrib import admin
+from django.db import transaction
 
+from .caching import bump_todo_version, bump_todo_versions
+from .hashtag_ids import forget_ids
 from .models import Hashtag, Todo
+from .stats import StatsDeltas
 
 
 class TodoAdmin(admin.ModelAdmin):
     list_display = ["input", "owner"]
     readonly_fields = ("owner",)
 
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        stats = StatsDeltas()
+        if change:
+            stats.remove(Todo.objects.select_for_update().get(pk=obj.pk))
+        super().save_model(request, obj, form, change)
+        stats.add(obj).save()
+
+    @transaction.atomic
+    def save_related(self, request, form, formsets, change):
+        todo = form.instance
+        stats = StatsDeltas().tag(todo.owner_id, todo.hashtag_names, -1)
+        super().save_related(request, form, formsets, change)
+        # The form sets the M2M directly; the signal rewrote the names.
+        todo.refresh_from_db(fields=["hashtag_names"])
+        stats.tag(todo.owner_id, todo.hashtag_names).save()
+        # Bumped only once the rows are visible, or a read in between would
+        # cache the old rows under the new version.
+        transaction.on_commit(partial(bump_todo_version, todo.owner_id))
+
+    @transaction.atomic
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        StatsDeltas().remove(obj).save()
+        transaction.on_commit(partial(bump_todo_version, obj.owner_id))
+
+    @transaction.atomic
+    def delete_queryset(self, request, queryset):
+        stats = StatsDeltas()
+        rows = list(
+            queryset.values_list("owner_id", "priority", "done", "hashtag_names")
+        )
+        for owner_id, priority, done, names in rows:
+            stats.count(owner_id, priority, done, -1).tag(owner_id, names, -1)
+        super().delete_queryset(request, queryset)
+        stats.save()
+        transaction.on_commit(
+            partial(bump_todo_versions, [owner_id for owner_id, *_ in rows])
+        )
+
+
+class HashtagAdmin(admin.ModelAdmin):
+    # Hashtag names are copied into every tagged todo, so any change here has
+    # to rewrite those copies and invalidate the cached lists of their owners.
+    def _bump_owners(self, hashtags):
+        # Owners are read now, before a delete unlinks them, and bumped after
+        # commit.
+        owner_ids = list(
+            Todo.objects.filter(hashtag__in=hashtags).values_list("owner_id", flat=True)
+        )
+        transaction.on_commit(partial(bump_todo_versions, owner_ids))
+
+    def _tagged_todo_ids(self, hashtags):
+        return list(
+            Todo.objects.filter(hashtag__in=hashtags).values_list("id", flat=True)
+        )
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            # Both the old and the new name may be cached with this id.
+            old_name = Hashtag.objects.values_list("name", flat=True).get(pk=obj.pk)
+            transaction.on_commit(partial(forget_ids, [old_name, obj.name]))
+        super().save_model(request, obj, form, change)
+        if change:
+            Todo.sync_hashtag_names(Todo.objects.filter(hashtag=obj).values("id"))
+        self._bump_owners([obj])
+
+    def delete_model(self, request, obj):
+        self._bump_owners([obj])
+        todo_ids = self._tagged_todo_ids([obj])
+        super().delete_model(request, obj)
+        Todo.sync_hashtag_names(todo_ids)
+
+    def delete_queryset(self, request, queryset):
+        self._bump_owners(queryset)
+        todo_ids = self._tagged_todo_ids(queryset)
+        super().delete_queryset(request, queryset)
+        Todo.sync_hashtag_names(todo_ids)
+
 
 # Register your models here.
 admin.site.register(Todo, TodoAdmin)
-admin.site.register(Hashtag)
+admin.site.register(Hashtag, HashtagAdmin)
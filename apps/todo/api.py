@@ -1,58 +1,189 @@
 from uuid import UUID
 
-from django.shortcuts import Http404
-from ninja import Router
+from django.db import transaction
+from django.http import FileResponse
+from django.shortcuts import Http404, get_object_or_404
+from ninja import File, Form, Query, Router
+from ninja.files import UploadedFile
 from ninja_apikey.security import APIKeyAuth
 
-from apps.todo.models import Todo
-from apps.todo.schema import Message, TodoIn, TodoOut, TodoUpdateIn
+from apps.todo import writes
+from apps.todo.bulk import MAX_BULK_ITEMS, apply_bulk, bulk_size
+from apps.todo.caching import bump_todo_version, conditional_todos
+from apps.todo.exports import export_path
+from apps.todo.imports import import_path
+from apps.todo.models import Todo, TodoExport, TodoImport
+from apps.todo.pagination import (
+    InvalidCursor,
+    InvalidOrdering,
+    paginate,
+    parse_ordering,
+)
+from apps.todo.schema import (
+    HashtagCount,
+    HashtagMatch,
+    Message,
+    SearchMode,
+    TodoBulkIn,
+    TodoBulkOut,
+    TodoExportIn,
+    TodoExportOut,
+    TodoFileFormat,
+    TodoFilter,
+    TodoImportOut,
+    TodoIn,
+    TodoOut,
+    TodoPage,
+    TodoStatsOut,
+    TodoUpdateIn,
+)
+from apps.todo.stats import hashtag_usage, suggest_hashtags, todo_stats
+from apps.todo.streaming import stream_todos
+from apps.todo.tasks import export_todos, import_todos_file
 
 router = Router()
 auth = APIKeyAuth()
 
 
 @router.get("/search", response=list[TodoOut])
-def search(request, q: str = None, hashtags: str = None):
+@conditional_todos(list[TodoOut])
+def search(
+    request,
+    q: str = None,
+    hashtags: str = None,
+    mode: SearchMode = "contains",
+    match: HashtagMatch = "any",
+    limit: int = None,
+    stream: bool = False,
+):
     if not q and not hashtags:
         return []
-    todos = Todo.objects.filter(owner=request.user).prefetch_related("hashtag")
-    if q:
-        todos = todos.filter(input__icontains=q)
-    if hashtags:
-        todos = todos.filter(hashtag__name__in=hashtags.split(",")).distinct()
+    todos = Todo.objects.filter(owner=request.user).search(
+        q, hashtags.split(",") if hashtags else None, mode, limit, match
+    )
+    if stream:
+        return stream_todos(todos)
     return todos
 
 
-@router.get("/", response=list[TodoOut])
-def get_todos(request):
-    return Todo.objects.filter(owner=request.user)
+@router.get("/stats", response=TodoStatsOut)
+@conditional_todos(TodoStatsOut)
+def get_stats(request):
+    return todo_stats(request.user)
+
+
+@router.get("/hashtags", response=list[HashtagCount])
+@conditional_todos(list[HashtagCount])
+def get_hashtags(request, limit: int = None):
+    return hashtag_usage(request.user, limit)
+
+
+@router.get("/hashtags/suggest", response=list[HashtagCount])
+@conditional_todos(list[HashtagCount])
+def suggest(request, prefix: str = "", limit: int = None):
+    return suggest_hashtags(request.user, prefix, limit)
+
+
+@router.get("/", response={200: list[TodoOut] | TodoPage, 400: Message})
+@conditional_todos(list[TodoOut] | TodoPage)
+def get_todos(
+    request,
+    filters: TodoFilter = Query(...),
+    order: str = None,
+    limit: int = None,
+    after: str = None,
+    stream: bool = False,
+):
+    todos = filters.filter(Todo.objects.filter(owner=request.user))
+    try:
+        ordering = parse_ordering(order)
+    except InvalidOrdering as e:
+        return 400, Message(message=str(e))
+    if order:
+        todos = todos.order_by(*ordering)
+    if stream:
+        return stream_todos(todos)
+    if limit is None and after is None:
+        return todos
+    try:
+        items, next_cursor = paginate(todos, limit, after, ordering)
+    except InvalidCursor:
+        return 400, Message(message="invalid cursor")
+    return TodoPage(items=items, next=next_cursor)
 
 
 @router.post("/", response={200: TodoOut, 400: Message})
 def create_todo(request, todo: TodoIn):
     if not todo.input:
         return 400, Message(message="input is empty")
-    new_todo = Todo.objects.create(input=todo.input, owner=request.user)
+    new_todo = writes.create_todo(request.user, todo.input)
+    bump_todo_version(request.user.id)
     return TodoOut.from_orm(new_todo)
 
 
+@router.post("/bulk", response={200: TodoBulkOut, 400: Message})
+def bulk_todos(request, payload: TodoBulkIn):
+    if bulk_size(payload) > MAX_BULK_ITEMS:
+        return 400, Message(message=f"at most {MAX_BULK_ITEMS} items per request")
+    results = apply_bulk(request.user, payload)
+    bump_todo_version(request.user.id)
+    return TodoBulkOut(results=results)
+
+
+@router.post("/exports", response={202: TodoExportOut})
+def create_export(request, options: TodoExportIn):
+    export = TodoExport.objects.create(owner=request.user, format=options.format)
+    transaction.on_commit(lambda: export_todos.delay(str(export.id)))
+    return 202, export
+
+
+@router.get("/exports/{uuid:export_id}", response=TodoExportOut)
+def get_export(request, export_id: UUID):
+    return get_object_or_404(TodoExport, id=export_id, owner=request.user)
+
+
+@router.get("/exports/{uuid:export_id}/download", response={409: Message, 410: Message})
+def download_export(request, export_id: UUID):
+    export = get_object_or_404(TodoExport, id=export_id, owner=request.user)
+    if export.status != TodoExport.Status.DONE:
+        return 409, Message(message=f"export is {export.status}")
+    try:
+        file = open(export_path(export), "rb")
+    except FileNotFoundError:
+        return 410, Message(message="export file is no longer available")
+    return FileResponse(file, as_attachment=True, filename=f"todos.{export.format}.gz")
+
+
+@router.post("/imports", response={202: TodoImportOut})
+def create_import(
+    request, file: UploadedFile = File(...), format: TodoFileFormat = Form("ndjson")
+):
+    todo_import = TodoImport.objects.create(owner=request.user, format=format)
+    path = import_path(todo_import)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+    todo_import.file = path.name
+    todo_import.save(update_fields=["file"])
+    transaction.on_commit(lambda: import_todos_file.delay(str(todo_import.id)))
+    return 202, todo_import
+
+
+@router.get("/imports/{uuid:import_id}", response=TodoImportOut)
+def get_import(request, import_id: UUID):
+    return get_object_or_404(TodoImport, id=import_id, owner=request.user)
+
+
 @router.patch("/{uuid:todo_id}", response=TodoOut)
 def edit_todo(request, newInfo: TodoUpdateIn, todo_id: UUID):
     if not todo_id:
         raise Http404("Todo ID not provided")
     try:
-        todo = Todo.objects.get(id=todo_id, owner=request.user)
+        todo = writes.edit_todo(request.user, todo_id, newInfo)
     except Todo.DoesNotExist:
         raise Http404("Todo not found")
-    if newInfo.input is not None:
-        todo.input = newInfo.input
-    if newInfo.done is not None:
-        todo.done = newInfo.done
-    if newInfo.priority is not None:
-        todo.priority = newInfo.priority
-    if newInfo.hashtag is not None:
-        todo.update_hashtags(newInfo.hashtag)
-    todo.save()
+    bump_todo_version(request.user.id)
     return todo
 
 
@@ -60,9 +191,7 @@ def edit_todo(request, newInfo: TodoUpdateIn, todo_id: UUID):
 def delete_todo(request, todo_id: UUID):
     if not todo_id:
         raise Http404("Todo ID not provided")
-    try:
-        todo = Todo.objects.get(id=todo_id, owner=request.user)
-    except Todo.DoesNotExist:
+    if not writes.delete_todo(request.user, todo_id):
         raise Http404("Todo not found")
-    todo.delete()
+    bump_todo_version(request.user.id)
     return Message(message="deleted")
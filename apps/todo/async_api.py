@@ -0,0 +1,132 @@
+from uuid import UUID
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import Http404
+from ninja import Query, Router
+
+from apps.todo import writes
+from apps.todo.bulk import MAX_BULK_ITEMS, apply_bulk, bulk_size
+from apps.todo.caching import abump_todo_version, conditional_todos
+from apps.todo.models import Todo
+from apps.todo.pagination import (
+    InvalidCursor,
+    InvalidOrdering,
+    apaginate,
+    parse_ordering,
+)
+from apps.todo.schema import (
+    HashtagCount,
+    HashtagMatch,
+    Message,
+    SearchMode,
+    TodoBulkIn,
+    TodoBulkOut,
+    TodoFilter,
+    TodoIn,
+    TodoOut,
+    TodoPage,
+    TodoStatsOut,
+    TodoUpdateIn,
+)
+from apps.todo.stats import ahashtag_usage, asuggest_hashtags, atodo_stats
+
+router = Router()
+
+
+@router.get("/search", response=list[TodoOut])
+@conditional_todos(list[TodoOut])
+async def search(
+    request,
+    q: str = None,
+    hashtags: str = None,
+    mode: SearchMode = "contains",
+    match: HashtagMatch = "any",
+    limit: int = None,
+):
+    if not q and not hashtags:
+        return []
+    todos = Todo.objects.filter(owner=request.user).search(
+        q, hashtags.split(",") if hashtags else None, mode, limit, match
+    )
+    return [todo async for todo in todos]
+
+
+@router.get("/stats", response=TodoStatsOut)
+@conditional_todos(TodoStatsOut)
+async def get_stats(request):
+    return await atodo_stats(request.user)
+
+
+@router.get("/hashtags", response=list[HashtagCount])
+@conditional_todos(list[HashtagCount])
+async def get_hashtags(request, limit: int = None):
+    return await ahashtag_usage(request.user, limit)
+
+
+@router.get("/hashtags/suggest", response=list[HashtagCount])
+@conditional_todos(list[HashtagCount])
+async def suggest(request, prefix: str = "", limit: int = None):
+    return await asuggest_hashtags(request.user, prefix, limit)
+
+
+@router.get("/", response={200: list[TodoOut] | TodoPage, 400: Message})
+@conditional_todos(list[TodoOut] | TodoPage)
+async def get_todos(
+    request,
+    filters: TodoFilter = Query(...),
+    order: str = None,
+    limit: int = None,
+    after: str = None,
+):
+    todos = filters.filter(Todo.objects.filter(owner=request.user))
+    try:
+        ordering = parse_ordering(order)
+    except InvalidOrdering as e:
+        return 400, Message(message=str(e))
+    if order:
+        todos = todos.order_by(*ordering)
+    if limit is None and after is None:
+        return [todo async for todo in todos]
+    try:
+        items, next_cursor = await apaginate(todos, limit, after, ordering)
+    except InvalidCursor:
+        return 400, Message(message="invalid cursor")
+    return TodoPage(items=items, next=next_cursor)
+
+
+@router.post("/", response={200: TodoOut, 400: Message})
+async def create_todo(request, todo: TodoIn):
+    if not todo.input:
+        return 400, Message(message="input is empty")
+    # Writes update the owner's counters in the same transaction, which the
+    # async ORM cannot open, so they run on the sync thread.
+    new_todo = await sync_to_async(writes.create_todo)(request.user, todo.input)
+    await abump_todo_version(request.user.id)
+    return TodoOut.from_orm(new_todo)
+
+
+@router.post("/bulk", response={200: TodoBulkOut, 400: Message})
+async def bulk_todos(request, payload: TodoBulkIn):
+    if bulk_size(payload) > MAX_BULK_ITEMS:
+        return 400, Message(message=f"at most {MAX_BULK_ITEMS} items per request")
+    results = await sync_to_async(apply_bulk)(request.user, payload)
+    await abump_todo_version(request.user.id)
+    return TodoBulkOut(results=results)
+
+
+@router.patch("/{uuid:todo_id}", response=TodoOut)
+async def edit_todo(request, newInfo: TodoUpdateIn, todo_id: UUID):
+    try:
+        todo = await sync_to_async(writes.edit_todo)(request.user, todo_id, newInfo)
+    except Todo.DoesNotExist:
+        raise Http404("Todo not found")
+    await abump_todo_version(request.user.id)
+    return todo
+
+
+@router.delete("/{uuid:todo_id}", response=Message)
+async def delete_todo(request, todo_id: UUID):
+    if not await sync_to_async(writes.delete_todo)(request.user, todo_id):
+        raise Http404("Todo not found")
+    await abump_todo_version(request.user.id)
+    return Message(message="deleted")
@@ -0,0 +1,127 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from apps.todo.hashtag_ids import retry_stale_ids
+from apps.todo.models import Hashtag, Todo
+from apps.todo.schema import TodoBulkIn, TodoBulkResult, TodoIn, TodoUpdateIn
+from apps.todo.stats import StatsDeltas
+
+MAX_BULK_ITEMS = 500
+UPDATABLE_FIELDS = ("input", "done", "priority")
+
+
+def bulk_size(payload: TodoBulkIn) -> int:
+    return len(payload.create) + len(payload.update) + len(payload.delete)
+
+
+def _invalid(item: TodoIn | TodoUpdateIn) -> str | None:
+    # Checked per item up front, since a rejected row would roll back the batch.
+    if item.priority is not None:
+        try:
+            Todo._meta.get_field("priority").run_validators(item.priority)
+        except ValidationError:
+            return "priority is out of range"
+    max_length = Hashtag._meta.get_field("name").max_length
+    if item.hashtag and any(len(name) > max_length for name in item.hashtag):
+        return "hashtag is too long"
+    return None
+
+
+@retry_stale_ids
+def apply_bulk(owner, payload: TodoBulkIn) -> list[TodoBulkResult]:
+    stats = StatsDeltas()
+    with transaction.atomic():
+        results = [
+            *_bulk_create(owner, payload, stats),
+            *_bulk_update(owner, payload, stats),
+            *_bulk_delete(owner, payload, stats),
+        ]
+        stats.save()
+    return results
+
+
+def _bulk_create(
+    owner, payload: TodoBulkIn, stats: StatsDeltas
+) -> list[TodoBulkResult]:
+    results, todos, hashtags = [], [], {}
+    for item in payload.create:
+        error = "input is empty" if not item.input else _invalid(item)
+        if error:
+            results.append(TodoBulkResult(action="create", status=400, message=error))
+            continue
+        todo = Todo(
+            owner=owner, input=item.input, done=item.done, priority=item.priority
+        )
+        if item.hashtag:
+            todo.hashtag_names = sorted(set(item.hashtag))
+            hashtags[todo.id] = item.hashtag
+        todos.append(todo)
+        stats.add(todo)
+        results.append(TodoBulkResult(action="create", id=todo.id, status=201))
+    Todo.objects.bulk_create(todos)
+    Todo.bulk_set_hashtags(hashtags)
+    return results
+
+
+def _bulk_update(
+    owner, payload: TodoBulkIn, stats: StatsDeltas
+) -> list[TodoBulkResult]:
+    todos = (
+        Todo.objects.select_for_update()
+        .filter(owner=owner, id__in=[item.id for item in payload.update])
+        .in_bulk()
+    )
+    results, fields, hashtags = [], set(), {}
+    for item in payload.update:
+        todo = todos.get(item.id)
+        if todo is None:
+            results.append(
+                TodoBulkResult(
+                    action="update", id=item.id, status=404, message="Todo not found"
+                )
+            )
+            continue
+        error = _invalid(item)
+        if error:
+            results.append(
+                TodoBulkResult(action="update", id=item.id, status=400, message=error)
+            )
+            continue
+        stats.remove(todo)
+        for field in UPDATABLE_FIELDS:
+            value = getattr(item, field)
+            if value is not None:
+                setattr(todo, field, value)
+                fields.add(field)
+        if item.hashtag is not None:
+            todo.hashtag_names = sorted(set(item.hashtag))
+            hashtags[todo.id] = item.hashtag
+        stats.add(todo)
+        results.append(TodoBulkResult(action="update", id=item.id, status=200))
+    if fields:
+        Todo.objects.bulk_update(todos.values(), sorted(fields))
+    Todo.bulk_set_hashtags(hashtags)
+    return results
+
+
+def _bulk_delete(
+    owner, payload: TodoBulkIn, stats: StatsDeltas
+) -> list[TodoBulkResult]:
+    todos = Todo.objects.filter(owner=owner, id__in=payload.delete)
+    found = set()
+    for todo_id, priority, done, names in todos.select_for_update().values_list(
+        "id", "priority", "done", "hashtag_names"
+    ):
+        found.add(todo_id)
+        stats.count(owner.id, priority, done, -1).tag(owner.id, names, -1)
+    todos.delete()
+    return [
+        (
+            TodoBulkResult(action="delete", id=todo_id, status=200)
+            if todo_id in found
+            else TodoBulkResult(
+                action="delete", id=todo_id, status=404, message="Todo not found"
+            )
+        )
+        for todo_id in payload.delete
+    ]
@@ -0,0 +1,138 @@
+import hashlib
+import inspect
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.http.response import HttpResponseBase
+from django.utils.cache import parse_etags
+from pydantic import TypeAdapter
+
+VERSION_KEY = "todos:version:{}"
+PAYLOAD_KEY = "todos:payload:{}:{}"
+
+
+def todo_version(user_id) -> str:
+    key = VERSION_KEY.format(user_id)
+    version = cache.get(key)
+    if version is None:
+        # add() keeps the first version if two requests race to create it.
+        cache.add(key, uuid.uuid4().hex, timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def atodo_version(user_id) -> str:
+    key = VERSION_KEY.format(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, uuid.uuid4().hex, timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_todo_version(user_id):
+    cache.set(VERSION_KEY.format(user_id), uuid.uuid4().hex, timeout=None)
+
+
+async def abump_todo_version(user_id):
+    await cache.aset(VERSION_KEY.format(user_id), uuid.uuid4().hex, timeout=None)
+
+
+def bump_todo_versions(user_ids):
+    cache.set_many(
+        {VERSION_KEY.format(user_id): uuid.uuid4().hex for user_id in set(user_ids)},
+        timeout=None,
+    )
+
+
+def _etag(version: str, request) -> str:
+    digest = hashlib.sha256(f"{version}:{request.get_full_path()}".encode())
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def todo_etag(request) -> str:
+    return _etag(todo_version(request.user.id), request)
+
+
+async def atodo_etag(request) -> str:
+    return _etag(await atodo_version(request.user.id), request)
+
+
+def _set_validators(response: HttpResponseBase, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def conditional_todos(schema):
+    """
+    Answer ``If-None-Match`` with 304 from the user's change version alone, so
+    unchanged polls never query or serialize todos, and tag fresh responses
+    with an ``ETag``.
+
+    Rendered payloads are cached under the same version, so a write makes
+    every cached list and search of that user unreachable at once. Coroutine
+    views get a wrapper that uses the async cache API.
+    """
+    adapter = TypeAdapter(schema)
+
+    def not_modified(request, etag):
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            return _set_validators(HttpResponseNotModified(), etag)
+
+    def cached(payload, etag):
+        response = HttpResponse(payload, content_type="application/json")
+        return _set_validators(response, etag)
+
+    def render(result):
+        return adapter.dump_json(adapter.validate_python(result))
+
+    def decorator(view):
+        if inspect.iscoroutinefunction(view):
+
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                etag = await atodo_etag(request)
+                if (response := not_modified(request, etag)) is not None:
+                    return response
+                key = PAYLOAD_KEY.format(request.user.id, etag.strip('"'))
+                payload = await cache.aget(key)
+                if payload is not None:
+                    return cached(payload, etag)
+                result = await view(request, *args, **kwargs)
+                if isinstance(result, tuple):
+                    return result
+                if not isinstance(result, HttpResponseBase):
+                    payload = render(result)
+                    if len(payload) <= settings.TODO_CACHE_MAX_BYTES:
+                        await cache.aset(key, payload, settings.TODO_CACHE_TIMEOUT)
+                    result = HttpResponse(payload, content_type="application/json")
+                return _set_validators(result, etag)
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            etag = todo_etag(request)
+            if (response := not_modified(request, etag)) is not None:
+                return response
+            key = PAYLOAD_KEY.format(request.user.id, etag.strip('"'))
+            payload = cache.get(key)
+            if payload is not None:
+                return cached(payload, etag)
+            result = view(request, *args, **kwargs)
+            if isinstance(result, tuple):
+                return result
+            if not isinstance(result, HttpResponseBase):
+                payload = render(result)
+                if len(payload) <= settings.TODO_CACHE_MAX_BYTES:
+                    cache.set(key, payload, settings.TODO_CACHE_TIMEOUT)
+                result = HttpResponse(payload, content_type="application/json")
+            return _set_validators(result, etag)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,63 @@
+import csv
+import gzip
+import json
+import os
+from pathlib import Path
+
+from django.conf import settings
+
+from apps.todo.models import Todo, TodoExport
+
+EXPORT_CHUNK_SIZE = 1000
+CSV_FIELDS = [
+    "id",
+    "input",
+    "done",
+    "priority",
+    "created_at",
+    "finished_at",
+    "hashtags",
+]
+
+
+def export_path(export: TodoExport) -> Path:
+    return Path(settings.TODO_EXPORT_ROOT) / f"{export.id}.{export.format}.gz"
+
+
+def export_rows(owner):
+    todos = (
+        Todo.objects.filter(owner=owner)
+        .order_by("created_at", "id")
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    for todo in todos:
+        yield {
+            "id": str(todo.id),
+            "input": todo.input,
+            "done": todo.done,
+            "priority": todo.priority,
+            "created_at": todo.created_at.isoformat(),
+            "finished_at": todo.finished_at.isoformat(),
+            "hashtags": todo.hashtag_names,
+        }
+
+
+def write_export(export: TodoExport) -> int:
+    path = export_path(export)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".part")
+    rows = 0
+    # Write to a side file and rename it into place, so a download never sees
+    # a half-written archive.
+    with gzip.open(partial, "wt", encoding="utf-8", newline="") as output:
+        if export.format == TodoExport.Format.CSV:
+            writer = csv.DictWriter(output, fieldnames=CSV_FIELDS)
+            writer.writeheader()
+        for row in export_rows(export.owner_id):
+            if export.format == TodoExport.Format.CSV:
+                writer.writerow({**row, "hashtags": " ".join(row["hashtags"])})
+            else:
+                output.write(json.dumps(row) + "\n")
+            rows += 1
+    os.replace(partial, path)
+    return rows
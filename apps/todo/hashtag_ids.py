@@ -0,0 +1,90 @@
+import hashlib
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError
+
+from todo_app.local_cache import LocalKeyCache
+
+CACHE_KEY = "hashtag:id:{}"
+# Django names the foreign keys of the M2M and usage rows "..._fk_todo_hashtag_id".
+HASHTAG_FK_SUFFIX = "_fk_todo_hashtag_id"
+
+local_ids = LocalKeyCache(getattr(settings, "HASHTAG_LOCAL_CACHE_SIZE", 4096))
+# Set while a write is retried because a cached id no longer existed.
+_bypass = ContextVar("hashtag_ids_bypass", default=False)
+
+
+def _key(name: str) -> str:
+    return CACHE_KEY.format(hashlib.sha256(name.encode()).hexdigest()[:32])
+
+
+def _local_timeout() -> float:
+    return getattr(settings, "HASHTAG_LOCAL_CACHE_TIMEOUT", 60)
+
+
+def cached_ids(names: list[str]) -> dict[str, int]:
+    """Ids of the ``names`` known to this process or the shared cache."""
+    if _bypass.get():
+        return {}
+    ids, missing = {}, []
+    for name in names:
+        hashtag_id = local_ids.get(name)
+        if hashtag_id is None:
+            missing.append(name)
+        else:
+            ids[name] = hashtag_id
+    if missing:
+        shared = cache.get_many([_key(name) for name in missing])
+        for name in missing:
+            hashtag_id = shared.get(_key(name))
+            if hashtag_id is not None:
+                ids[name] = hashtag_id
+                local_ids.set(name, hashtag_id, _local_timeout())
+    return ids
+
+
+def remember_ids(ids: dict[str, int]):
+    for name, hashtag_id in ids.items():
+        local_ids.set(name, hashtag_id, _local_timeout())
+    cache.set_many(
+        {_key(name): hashtag_id for name, hashtag_id in ids.items()},
+        timeout=getattr(settings, "HASHTAG_CACHE_TIMEOUT", 3600),
+    )
+
+
+def forget_ids(names: list[str]):
+    for name in names:
+        local_ids.delete(name)
+    cache.delete_many([_key(name) for name in names])
+
+
+def _stale_id(error: IntegrityError) -> bool:
+    diag = getattr(error.__cause__, "diag", None)
+    return (getattr(diag, "constraint_name", None) or "").endswith(HASHTAG_FK_SUFFIX)
+
+
+def retry_stale_ids(fn):
+    """
+    Run ``fn`` once more, resolving every name in the database, if it failed
+    because a cached hashtag id was deleted meanwhile.
+
+    Foreign keys are checked at commit, so ``fn`` must own its transaction.
+    """
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except IntegrityError as e:
+            if _bypass.get() or not _stale_id(e):
+                raise
+        token = _bypass.set(True)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _bypass.reset(token)
+
+    return wrapper
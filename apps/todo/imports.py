@@ -0,0 +1,155 @@
+import csv
+import gzip
+import io
+import json
+import uuid
+from datetime import date
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+
+from apps.todo.caching import bump_todo_version
+from apps.todo.hashtag_ids import retry_stale_ids
+from apps.todo.models import Hashtag, Todo, TodoImport
+from apps.todo.stats import StatsDeltas
+
+IMPORT_BATCH_SIZE = 5000
+
+
+class InvalidImportRow(ValueError):
+    pass
+
+
+def import_path(todo_import: TodoImport) -> Path:
+    return Path(settings.TODO_IMPORT_ROOT) / f"{todo_import.id}.{todo_import.format}"
+
+
+def open_import(path):
+    """Open an import file as text, transparently un-gzipping exported archives."""
+    raw = open(path, "rb")
+    if raw.peek(2)[:2] == b"\x1f\x8b":
+        raw = gzip.GzipFile(fileobj=raw)
+    return io.TextIOWrapper(raw, encoding="utf-8", newline="")
+
+
+def read_rows(lines, format: str):
+    if format == TodoImport.Format.CSV:
+        for row in csv.DictReader(lines):
+            row["hashtags"] = (row.get("hashtags") or "").split()
+            yield row
+    else:
+        for line in lines:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Passed on as text so to_todo_row skips just this row.
+                    yield line
+
+
+def _parse_bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes")
+    return bool(value)
+
+
+def to_todo_row(owner_id, row: dict) -> tuple[tuple, list[str]]:
+    if not isinstance(row, dict):
+        raise InvalidImportRow("row is not an object")
+    text = row.get("input") or ""
+    if not isinstance(text, str) or not text.strip():
+        raise InvalidImportRow("input is empty")
+    text = text.strip()
+    hashtags = row.get("hashtags") or []
+    if isinstance(hashtags, str):
+        hashtags = hashtags.split()
+    if not isinstance(hashtags, list) or not all(
+        isinstance(name, str) for name in hashtags
+    ):
+        raise InvalidImportRow("hashtags must be a list of strings")
+    hashtags = list(dict.fromkeys(hashtags))
+    if any(len(name) > Hashtag._meta.get_field("name").max_length for name in hashtags):
+        raise InvalidImportRow("hashtag is too long")
+    today = date.today()
+    try:
+        created_at = (
+            date.fromisoformat(row["created_at"]) if row.get("created_at") else today
+        )
+        finished_at = (
+            date.fromisoformat(row["finished_at"])
+            if row.get("finished_at")
+            else created_at
+        )
+        priority = int(row.get("priority") or 1)
+        Todo._meta.get_field("priority").run_validators(priority)
+    except (TypeError, ValueError, ValidationError) as e:
+        raise InvalidImportRow(str(e))
+    # Imported rows always get fresh ids so re-importing an export never
+    # collides with the todos it was taken from.
+    values = (
+        uuid.uuid4(),
+        owner_id,
+        text,
+        created_at,
+        finished_at,
+        _parse_bool(row.get("done")),
+        priority,
+        sorted(hashtags),
+    )
+    return values, hashtags
+
+
+@retry_stale_ids
+@transaction.atomic
+def _copy_batch(todos: list[tuple[tuple, list[str]]]):
+    ids = Hashtag.get_or_create_ids(
+        [name for _, hashtags in todos for name in hashtags]
+    )
+    through = Todo.hashtag.through
+    with connection.cursor() as cursor:
+        with cursor.copy(
+            f"COPY {Todo._meta.db_table} "
+            "(id, owner_id, input, created_at, finished_at, done, priority, "
+            "hashtag_names) FROM STDIN"
+        ) as copy:
+            for values, _ in todos:
+                copy.write_row(values)
+        with cursor.copy(
+            f"COPY {through._meta.db_table} (todo_id, hashtag_id) FROM STDIN"
+        ) as copy:
+            for values, hashtags in todos:
+                for name in hashtags:
+                    copy.write_row((values[0], ids[name]))
+    stats = StatsDeltas()
+    for values, _ in todos:
+        _, owner_id, _, _, _, done, priority, names = values
+        stats.count(owner_id, priority, done).tag(owner_id, names)
+    stats.save()
+
+
+def import_todos(owner_id, rows, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Load parsed rows for ``owner_id`` with COPY, one transaction per batch.
+
+    Returns ``(imported, skipped)``; ``progress`` is called after every batch.
+    """
+    imported = skipped = 0
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        todos = []
+        for row in batch:
+            try:
+                todos.append(to_todo_row(owner_id, row))
+            except InvalidImportRow:
+                skipped += 1
+        if todos:
+            _copy_batch(todos)
+            # Committed batches are visible at once, so cached lists must go.
+            bump_todo_version(owner_id)
+        imported += len(todos)
+        if progress:
+            progress(imported, skipped)
+    return imported, skipped
@@ -0,0 +1,91 @@
+import asyncio
+import statistics
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, override_settings
+from ninja_apikey.models import APIKey
+from ninja_apikey.security import generate_key
+
+from apps.todo.models import Todo
+from apps.user.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync and async todo APIs by sending concurrent requests "
+        "through the ASGI handler in a single process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=50)
+        parser.add_argument("--todos", type=int, default=100)
+        parser.add_argument("--path", default="/todos/?limit=50")
+        parser.add_argument(
+            "--cache",
+            action="store_true",
+            help="Keep the rendered payload cache enabled",
+        )
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(
+            username=f"bench-{uuid.uuid4().hex[:8]}", password=uuid.uuid4().hex
+        )
+        try:
+            key = generate_key()
+            APIKey.objects.create(
+                prefix=key.prefix, hashed_key=key.hashed_key, user=user, label="bench"
+            )
+            Todo.objects.bulk_create(
+                Todo(owner=user, input=f"bench todo {i}", priority=i % 5 + 1)
+                for i in range(options["todos"])
+            )
+            headers = {"X-API-Key": f"{key.prefix}.{key.key}"}
+            overrides = {} if options["cache"] else {"TODO_CACHE_MAX_BYTES": 0}
+            with override_settings(**overrides):
+                for name, prefix in (("sync", "/api"), ("async", "/api/async")):
+                    latencies, elapsed = asyncio.run(
+                        self.run(
+                            prefix + options["path"],
+                            headers,
+                            options["requests"],
+                            options["concurrency"],
+                        )
+                    )
+                    self.report(name, latencies, elapsed)
+        finally:
+            user.delete()
+
+    async def run(self, path, headers, requests, concurrency):
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path, headers=headers)
+                latencies.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} returned {response.status_code}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(request() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        # Sync views and ORM calls ran on the shared sync thread; release its
+        # connection before the event loop goes away.
+        await sync_to_async(connections.close_all)()
+        return latencies, elapsed
+
+    def report(self, name, latencies, elapsed):
+        latencies = sorted(latencies)
+        p99 = latencies[int(len(latencies) * 0.99) - 1] if latencies else 0
+        self.stdout.write(
+            f"{name:>5}: {len(latencies) / elapsed:.0f} req/s, "
+            f"p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p99 {p99 * 1000:.1f} ms"
+        )
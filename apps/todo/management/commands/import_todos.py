@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.todo.imports import IMPORT_BATCH_SIZE, import_todos, open_import, read_rows
+from apps.todo.models import TodoImport
+from apps.user.models import User
+
+
+class Command(BaseCommand):
+    help = "Bulk load todos for a user from an NDJSON or CSV file using COPY."
+
+    def add_arguments(self, parser):
+        parser.add_argument("username")
+        parser.add_argument("path", help="NDJSON or CSV file, optionally gzipped")
+        parser.add_argument(
+            "--format", choices=TodoImport.Format.values, default="ndjson"
+        )
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["username"])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist")
+
+        started = time.monotonic()
+
+        def progress(imported, skipped):
+            rate = imported / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f"{imported} imported, {skipped} skipped ({rate:.0f} rows/s)"
+            )
+
+        with open_import(options["path"]) as lines:
+            imported, skipped = import_todos(
+                user.id,
+                read_rows(lines, options["format"]),
+                batch_size=options["batch_size"],
+                progress=progress,
+            )
+        self.stdout.write(
+            self.style.SUCCESS(f"Imported {imported} todos ({skipped} skipped)")
+        )
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:15
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todo", "0003_alter_todo_hashtag"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="todo",
+            index=models.Index(
+                fields=["owner", "created_at", "id"], name="todo_owner_created_idx"
+            ),
+        ),
+    ]
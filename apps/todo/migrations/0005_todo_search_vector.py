@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:16
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todo", "0004_todo_owner_created_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="todo",
+            name="search_vector",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=django.contrib.postgres.search.SearchVector(
+                    "input", config="english"
+                ),
+                output_field=django.contrib.postgres.search.SearchVectorField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="todo",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="todo_search_vector_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.1 on 2026-10-18 18:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todo", "0008_todoimport"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="todo",
+            index=models.Index(
+                fields=["owner", "done", "priority", "created_at"],
+                name="todo_owner_done_priority_idx",
+            ),
+        ),
+    ]
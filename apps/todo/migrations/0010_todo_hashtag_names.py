@@ -0,0 +1,47 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:10
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todo", "0009_todo_owner_done_priority_idx"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="todo",
+            name="hashtag_names",
+            field=django.contrib.postgres.fields.ArrayField(
+                base_field=models.CharField(max_length=50),
+                blank=True,
+                default=list,
+                editable=False,
+                size=None,
+            ),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE todo_todo AS todo SET hashtag_names = tags.names
+            FROM (
+                SELECT link.todo_id, array_agg(hashtag.name ORDER BY hashtag.name) AS names
+                FROM todo_todo_hashtag AS link
+                JOIN todo_hashtag AS hashtag ON hashtag.id = link.hashtag_id
+                GROUP BY link.todo_id
+            ) AS tags
+            WHERE todo.id = tags.todo_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name="todo",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["hashtag_names"], name="todo_hashtag_names_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todo", "0010_todo_hashtag_names"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TodoStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("priority", models.PositiveSmallIntegerField()),
+                ("total", models.IntegerField(default=0)),
+                ("done", models.IntegerField(default=0)),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("owner", "priority"),
+                        name="todo_stats_owner_priority_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO todo_todostats (owner_id, priority, total, done)
+            SELECT owner_id, priority, count(*), count(*) FILTER (WHERE done)
+            FROM todo_todo
+            GROUP BY owner_id, priority
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
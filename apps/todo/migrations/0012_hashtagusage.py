@@ -0,0 +1,69 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("todo", "0011_todostats"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HashtagUsage",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "hashtag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="usage",
+                        to="todo.hashtag",
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "-count"], name="hashtag_usage_owner_count_idx"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("owner", "hashtag"),
+                        name="hashtag_usage_owner_hashtag_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO todo_hashtagusage (owner_id, hashtag_id, count)
+            SELECT todo.owner_id, tag.hashtag_id, count(*)
+            FROM todo_todo todo
+            JOIN todo_todo_hashtag tag ON tag.todo_id = todo.id
+            GROUP BY todo.owner_id, tag.hashtag_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -1,7 +1,22 @@
 import uuid
+from functools import partial
 
-from django.db import models
+from django.contrib.postgres.expressions import ArraySubquery
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    SearchVectorField,
+    TrigramSimilarity,
+    TrigramWordSimilarity,
+)
+from django.db import connection, models, transaction
+from django.db.models.functions import Upper
 
+from apps.todo.hashtag_ids import cached_ids, remember_ids
+from apps.todo.pagination import clamp_limit
 from apps.user.models import User
 
 
@@ -11,6 +26,127 @@ class Hashtag(models.Model):
     def __str__(self) -> str:
         return self.name
 
+    @classmethod
+    def get_ids(cls, names: list[str]) -> dict[str, int]:
+        """Ids of the existing hashtags among ``names``, cached names first."""
+        names = list(dict.fromkeys(names))
+        ids = cached_ids(names)
+        return {**ids, **cls._read_ids([name for name in names if name not in ids])}
+
+    @classmethod
+    def get_or_create_ids(cls, names: list[str]) -> dict[str, int]:
+        names = list(dict.fromkeys(names))
+        ids = cached_ids(names)
+        missing = [name for name in names if name not in ids]
+        if missing:
+            # Upsert every unknown name in one statement. A no-op update on the
+            # existing rows locks them and returns their ids too, so the orphan
+            # cleanup cannot delete a name between its insert and its read.
+            hashtags = cls.objects.bulk_create(
+                [cls(name=name) for name in missing],
+                update_conflicts=True,
+                unique_fields=["name"],
+                update_fields=["name"],
+            )
+            created = {hashtag.name: hashtag.id for hashtag in hashtags}
+            transaction.on_commit(partial(remember_ids, created))
+            ids.update(created)
+        return ids
+
+    @classmethod
+    def _read_ids(cls, names: list[str]) -> dict[str, int]:
+        if not names:
+            return {}
+        ids = dict(cls.objects.filter(name__in=names).values_list("name", "id"))
+        # Cached only once committed: a rolled back insert would otherwise
+        # leave an id behind that no row has.
+        transaction.on_commit(partial(remember_ids, ids))
+        return ids
+
+
+SEARCH_CONFIG = "english"
+
+
+def _increment(model, keys: tuple, counters: tuple, rows: list[tuple]):
+    """Add ``rows`` of (*keys, *counters) to ``model``'s counters in one upsert."""
+    if not rows:
+        return
+    table = model._meta.db_table
+    columns = keys + counters
+    placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    # Sorted keys lock counter rows in the same order in every transaction.
+    rows = sorted(rows)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+            + ", ".join([placeholder] * len(rows))
+            + f" ON CONFLICT ({', '.join(keys)}) DO UPDATE SET "
+            + ", ".join(
+                f"{column} = {table}.{column} + EXCLUDED.{column}"
+                for column in counters
+            ),
+            [value for row in rows for value in row],
+        )
+
+
+class TodoQuerySet(models.QuerySet):
+    def search_fulltext(self, text: str):
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+        return (
+            self.filter(search_vector=query)
+            .annotate(rank=SearchRank(models.F("search_vector"), query))
+            .order_by("-rank")
+        )
+
+    def search_fuzzy(self, text: str):
+        # Both predicates compare UPPER(input), which is what icontains compiles
+        # to, so they share the trigram index instead of scanning the table.
+        return (
+            self.alias(input_upper=Upper("input"))
+            .filter(
+                models.Q(input_upper__trigram_word_similar=text)
+                | models.Q(input__icontains=text)
+            )
+            .annotate(
+                similarity=TrigramWordSimilarity(text, "input"),
+                closeness=TrigramSimilarity("input", text),
+            )
+            .order_by("-similarity", "-closeness")
+        )
+
+    def with_any_hashtag(self, names: list[str]):
+        return self.filter(hashtag_names__overlap=names)
+
+    def with_all_hashtags(self, names: list[str]):
+        return self.filter(hashtag_names__contains=names)
+
+    def search(
+        self,
+        q: str = None,
+        hashtags: list[str] = None,
+        mode="contains",
+        limit=None,
+        match="any",
+    ):
+        todos = self
+        if hashtags:
+            # Containment on the denormalized array uses its GIN index and
+            # needs neither the M2M join nor DISTINCT.
+            if match == "all":
+                todos = todos.with_all_hashtags(hashtags)
+            else:
+                todos = todos.with_any_hashtag(hashtags)
+        if q and mode == "fulltext":
+            # Ranked results are always capped so the planner can stop early.
+            return todos.search_fulltext(q)[: clamp_limit(limit)]
+        if q and mode == "fuzzy":
+            return todos.search_fuzzy(q)[: clamp_limit(limit)]
+        if q:
+            todos = todos.filter(input__icontains=q)
+        if limit is not None:
+            todos = todos[: clamp_limit(limit)]
+        return todos
+
 
 class Todo(models.Model):
     owner = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -21,13 +157,192 @@ class Todo(models.Model):
     done = models.BooleanField(default=False)
     priority = models.PositiveSmallIntegerField(default=1)
     hashtag = models.ManyToManyField(Hashtag, blank=True, related_name="todos")
+    # Sorted copy of the hashtag names for join-free filtering and rendering.
+    hashtag_names = ArrayField(
+        models.CharField(max_length=50), default=list, blank=True, editable=False
+    )
+    search_vector = models.GeneratedField(
+        expression=SearchVector("input", config=SEARCH_CONFIG),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = TodoQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["owner", "created_at", "id"], name="todo_owner_created_idx"
+            ),
+            models.Index(
+                fields=["owner", "done", "priority", "created_at"],
+                name="todo_owner_done_priority_idx",
+            ),
+            GinIndex(fields=["search_vector"], name="todo_search_vector_idx"),
+            GinIndex(fields=["hashtag_names"], name="todo_hashtag_names_idx"),
+            GinIndex(
+                OpClass(Upper("input"), name="gin_trgm_ops"),
+                name="todo_input_trgm_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.input
 
     def update_hashtags(self, hashtags: list[str]):
-        hashtags_list = []
-        for hashtag in hashtags:
-            hashtag_obj, created = Hashtag.objects.get_or_create(name=hashtag)
-            hashtags_list.append(hashtag_obj)
-        self.hashtag.set(hashtags_list)
+        names = sorted(set(hashtags))
+        self.hashtag.set(Hashtag.get_or_create_ids(names).values())
+        counts = {(self.owner_id, name): -1 for name in self.hashtag_names}
+        for name in names:
+            counts[(self.owner_id, name)] = counts.get((self.owner_id, name), 0) + 1
+        HashtagUsage.add_counts(counts)
+        # The m2m_changed receiver stores the names; keep this instance in
+        # step so a later save() does not write the old array back.
+        self.hashtag_names = names
+
+    @classmethod
+    def sync_hashtag_names(cls, todo_ids):
+        """Recompute ``hashtag_names`` from the M2M rows in one UPDATE."""
+        cls.objects.filter(id__in=todo_ids).update(
+            hashtag_names=ArraySubquery(
+                Hashtag.objects.filter(todos=models.OuterRef("pk"))
+                .order_by("name")
+                .values("name")
+            )
+        )
+
+    @classmethod
+    def bulk_set_hashtags(cls, hashtags_by_todo: dict):
+        """Replace the hashtags of many todos with a fixed number of queries."""
+        if not hashtags_by_todo:
+            return
+        ids = Hashtag.get_or_create_ids(
+            [name for names in hashtags_by_todo.values() for name in names]
+        )
+        through = cls.hashtag.through
+        through.objects.filter(todo_id__in=hashtags_by_todo.keys()).delete()
+        through.objects.bulk_create(
+            [
+                through(todo_id=todo_id, hashtag_id=ids[name])
+                for todo_id, names in hashtags_by_todo.items()
+                for name in dict.fromkeys(names)
+            ]
+        )
+        cls.objects.bulk_update(
+            [
+                cls(id=todo_id, hashtag_names=sorted(set(names)))
+                for todo_id, names in hashtags_by_todo.items()
+            ],
+            ["hashtag_names"],
+        )
+
+
+class TodoStats(models.Model):
+    """Per-owner, per-priority todo counters, updated by every todo write."""
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    priority = models.PositiveSmallIntegerField()
+    total = models.IntegerField(default=0)
+    done = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "priority"], name="todo_stats_owner_priority_uniq"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.owner}<{self.priority}:{self.done}/{self.total}>"
+
+    @classmethod
+    def add_counts(cls, counts: dict[tuple, tuple[int, int]]):
+        """Add (total, done) deltas keyed by (owner_id, priority)."""
+        _increment(
+            cls,
+            ("owner_id", "priority"),
+            ("total", "done"),
+            [
+                (owner_id, priority, total, done)
+                for (owner_id, priority), (total, done) in counts.items()
+                if total or done
+            ],
+        )
+
+
+class HashtagUsage(models.Model):
+    """How many of an owner's todos carry a hashtag, updated by every todo write."""
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name="usage")
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "hashtag"], name="hashtag_usage_owner_hashtag_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "-count"], name="hashtag_usage_owner_count_idx"
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.owner}<{self.hashtag_id}:{self.count}>"
+
+    @classmethod
+    def add_counts(cls, counts: dict[tuple, int]):
+        """Add count deltas keyed by (owner_id, hashtag name)."""
+        counts = {key: count for key, count in counts.items() if count}
+        ids = Hashtag.get_ids([name for _, name in counts])
+        _increment(
+            cls,
+            ("owner_id", "hashtag_id"),
+            ("count",),
+            [
+                (owner_id, ids[name], count)
+                for (owner_id, name), count in counts.items()
+                # A hashtag deleted meanwhile took its usage rows with it.
+                if name in ids
+            ],
+        )
+
+
+class TodoJob(models.Model):
+    class Format(models.TextChoices):
+        NDJSON = "ndjson"
+        CSV = "csv"
+
+    class Status(models.TextChoices):
+        PENDING = "pending"
+        RUNNING = "running"
+        DONE = "done"
+        FAILED = "failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE)
+    format = models.CharField(max_length=10, choices=Format.choices)
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING
+    )
+    file = models.CharField(max_length=255, blank=True)
+    rows = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self) -> str:
+        return f"{self.owner}<{self.format}:{self.status}>"
+
+
+class TodoExport(TodoJob):
+    pass
+
+
+class TodoImport(TodoJob):
+    pass
@@ -0,0 +1,115 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 100
+DEFAULT_ORDERING = ("created_at", "id")
+ORDERABLE_FIELDS = ("priority", "created_at", "done")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidOrdering(ValueError):
+    pass
+
+
+def parse_ordering(order: str | None) -> tuple[str, ...]:
+    """Turn ``-priority,created_at`` into a total ordering ending in ``id``."""
+    if not order:
+        return DEFAULT_ORDERING
+    fields = tuple(field.strip() for field in order.split(","))
+    names = [field.removeprefix("-") for field in fields]
+    if len(set(names)) != len(names) or not set(names) <= set(ORDERABLE_FIELDS):
+        raise InvalidOrdering(f"invalid order: {order}")
+    return (*fields, "id")
+
+
+def clamp_limit(limit: int | None) -> int:
+    return min(max(limit or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+
+
+def encode_cursor(obj, ordering=DEFAULT_ORDERING) -> str:
+    # The ordering travels with the values so a cursor cannot be replayed
+    # against a different sort.
+    values = [getattr(obj, field.lstrip("-")) for field in ordering]
+    raw = json.dumps(
+        {"order": list(ordering), "values": values},
+        cls=DjangoJSONEncoder,
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, model, ordering=DEFAULT_ORDERING) -> list:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("invalid cursor")
+    if not isinstance(data, dict) or data.get("order") != list(ordering):
+        raise InvalidCursor("invalid cursor")
+    values = data.get("values")
+    if not isinstance(values, list) or len(values) != len(ordering):
+        raise InvalidCursor("invalid cursor")
+    try:
+        values = [
+            model._meta.get_field(field.lstrip("-")).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except (ValidationError, TypeError, ValueError):
+        raise InvalidCursor("invalid cursor")
+    if None in values:
+        raise InvalidCursor("invalid cursor")
+    return values
+
+
+def keyset_filter(ordering, values) -> Q:
+    # (a, b) > (x, y) expanded as a > x OR (a = x AND b > y), honouring the
+    # direction of every column so descending orderings page correctly too.
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+def _page_queryset(queryset: QuerySet, limit: int, after: str | None, ordering):
+    queryset = queryset.order_by(*ordering)
+    if after:
+        queryset = queryset.filter(
+            keyset_filter(ordering, decode_cursor(after, queryset.model, ordering))
+        )
+    return queryset[: limit + 1]
+
+
+def _split_page(items: list, limit: int, ordering):
+    if len(items) > limit:
+        items = items[:limit]
+        return items, encode_cursor(items[-1], ordering)
+    return items, None
+
+
+def paginate(
+    queryset: QuerySet, limit: int | None, after: str | None, ordering=DEFAULT_ORDERING
+):
+    limit = clamp_limit(limit)
+    items = list(_page_queryset(queryset, limit, after, ordering))
+    return _split_page(items, limit, ordering)
+
+
+async def apaginate(
+    queryset: QuerySet, limit: int | None, after: str | None, ordering=DEFAULT_ORDERING
+):
+    limit = clamp_limit(limit)
+    items = [item async for item in _page_queryset(queryset, limit, after, ordering)]
+    return _split_page(items, limit, ordering)
@@ -1,9 +1,14 @@
+from datetime import datetime
+from typing import Literal
 from uuid import UUID
 
-from ninja import Schema
+from ninja import FilterSchema, Schema
 
 from .models import Todo
 
+SearchMode = Literal["contains", "fulltext", "fuzzy"]
+HashtagMatch = Literal["any", "all"]
+
 
 class TodoOut(Schema):
     id: UUID
@@ -14,7 +19,39 @@ class TodoOut(Schema):
 
     @staticmethod
     def resolve_hashtags(obj: Todo):
-        return obj.hashtag.all().values_list("name", flat=True)
+        # The denormalized names come with the row, so lists need no extra query.
+        return obj.hashtag_names
+
+
+class HashtagCount(Schema):
+    name: str
+    count: int
+
+
+class PriorityStats(Schema):
+    priority: int
+    total: int
+    done: int
+    pending: int
+
+
+class TodoStatsOut(Schema):
+    total: int
+    done: int
+    pending: int
+    by_priority: list[PriorityStats]
+
+
+class TodoPage(Schema):
+    items: list[TodoOut]
+    next: str | None = None
+
+
+class TodoFilter(FilterSchema):
+    done: bool | None = None
+    priority: int | None = None
+    priority__gte: int | None = None
+    priority__lte: int | None = None
 
 
 class TodoIn(Schema):
@@ -31,5 +68,46 @@ class TodoUpdateIn(Schema):
     hashtag: list[str] | None = None
 
 
+class TodoBulkUpdateIn(TodoUpdateIn):
+    id: UUID
+
+
+class TodoBulkIn(Schema):
+    create: list[TodoIn] = []
+    update: list[TodoBulkUpdateIn] = []
+    delete: list[UUID] = []
+
+
+class TodoBulkResult(Schema):
+    action: Literal["create", "update", "delete"]
+    id: UUID | None = None
+    status: int
+    message: str | None = None
+
+
+class TodoBulkOut(Schema):
+    results: list[TodoBulkResult]
+
+
+TodoFileFormat = Literal["ndjson", "csv"]
+
+
+class TodoExportIn(Schema):
+    format: TodoFileFormat = "ndjson"
+
+
+class TodoExportOut(Schema):
+    id: UUID
+    format: str
+    status: str
+    rows: int
+    created_at: datetime
+    finished_at: datetime | None = None
+
+
+class TodoImportOut(TodoExportOut):
+    error: str
+
+
 class Message(Schema):
     message: str
@@ -0,0 +1,28 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.dispatch import receiver
+
+from apps.todo.hashtag_ids import forget_ids
+from apps.todo.models import Hashtag, Todo
+
+
+@receiver(m2m_changed, sender=Todo.hashtag.through)
+def sync_hashtag_names(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        Todo.sync_hashtag_names([instance.pk])
+    elif action == "post_clear":
+        # pk_set is not sent for a clear, so its former todos are unknown here.
+        Todo.sync_hashtag_names(
+            Todo.objects.filter(hashtag_names__contains=[instance.name]).values("id")
+        )
+    else:
+        Todo.sync_hashtag_names(pk_set)
+
+
+@receiver(post_delete, sender=Hashtag)
+def forget_hashtag_id(sender, instance, **kwargs):
+    transaction.on_commit(partial(forget_ids, [instance.name]))
@@ -0,0 +1,107 @@
+from collections import defaultdict
+
+from django.db.models import F
+
+from apps.todo.models import HashtagUsage, Todo, TodoStats
+from apps.todo.pagination import clamp_limit
+
+SUGGEST_LIMIT = 10
+
+
+class StatsDeltas:
+    """
+    Counter changes collected while todos are written, applied with one
+    upsert per counter table in the same transaction.
+
+    Call ``remove`` with a todo's old state before changing it and ``add``
+    with the new state afterwards; unchanged counters cancel out.
+    """
+
+    def __init__(self):
+        self._deltas = defaultdict(lambda: [0, 0])
+        self._tags = defaultdict(int)
+
+    def add(self, todo: Todo, sign: int = 1):
+        self.tag(todo.owner_id, todo.hashtag_names, sign)
+        return self.count(todo.owner_id, todo.priority, todo.done, sign)
+
+    def remove(self, todo: Todo):
+        return self.add(todo, -1)
+
+    def count(self, owner_id, priority: int, done: bool, sign: int = 1):
+        delta = self._deltas[(owner_id, priority)]
+        delta[0] += sign
+        delta[1] += sign if done else 0
+        return self
+
+    def tag(self, owner_id, names: list[str], sign: int = 1):
+        for name in set(names):
+            self._tags[(owner_id, name)] += sign
+        return self
+
+    def save(self):
+        TodoStats.add_counts(self._deltas)
+        HashtagUsage.add_counts(self._tags)
+        self._deltas.clear()
+        self._tags.clear()
+
+
+def _stats_rows(owner):
+    return TodoStats.objects.filter(owner=owner, total__gt=0).order_by("priority")
+
+
+def todo_stats(owner) -> dict:
+    return _summarize(list(_stats_rows(owner)))
+
+
+async def atodo_stats(owner) -> dict:
+    return _summarize([row async for row in _stats_rows(owner)])
+
+
+def _usage_rows(owner, limit, prefix=None):
+    usage = HashtagUsage.objects.filter(owner=owner, count__gt=0)
+    if prefix:
+        # Matches through the varchar_pattern_ops index Django keeps for the
+        # unique name column.
+        usage = usage.filter(hashtag__name__startswith=prefix)
+    return usage.order_by("-count", "hashtag__name").values(
+        "count", name=F("hashtag__name")
+    )[: clamp_limit(limit)]
+
+
+def hashtag_usage(owner, limit: int = None) -> list[dict]:
+    """The owner's most used hashtags with their todo counts."""
+    return list(_usage_rows(owner, limit))
+
+
+async def ahashtag_usage(owner, limit: int = None) -> list[dict]:
+    return [row async for row in _usage_rows(owner, limit)]
+
+
+def suggest_hashtags(owner, prefix: str, limit: int = None) -> list[dict]:
+    """The owner's most used hashtags starting with ``prefix``."""
+    return list(_usage_rows(owner, limit or SUGGEST_LIMIT, prefix))
+
+
+async def asuggest_hashtags(owner, prefix: str, limit: int = None) -> list[dict]:
+    return [row async for row in _usage_rows(owner, limit or SUGGEST_LIMIT, prefix)]
+
+
+def _summarize(rows: list[TodoStats]) -> dict:
+    by_priority = [
+        {
+            "priority": row.priority,
+            "total": row.total,
+            "done": row.done,
+            "pending": row.total - row.done,
+        }
+        for row in rows
+    ]
+    total = sum(row["total"] for row in by_priority)
+    done = sum(row["done"] for row in by_priority)
+    return {
+        "total": total,
+        "done": done,
+        "pending": total - done,
+        "by_priority": by_priority,
+    }
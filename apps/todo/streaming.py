@@ -0,0 +1,28 @@
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+
+from apps.todo.schema import TodoOut
+
+STREAM_CHUNK_SIZE = 500
+
+
+def encode_todos(queryset: QuerySet):
+    # .iterator() walks a server-side cursor, so only one chunk of rows is
+    # ever held in memory.
+    yield "["
+    separator = ""
+    rows = []
+    for todo in queryset.iterator(chunk_size=STREAM_CHUNK_SIZE):
+        rows.append(TodoOut.from_orm(todo).model_dump_json())
+        if len(rows) == STREAM_CHUNK_SIZE:
+            yield separator + ",".join(rows)
+            separator, rows = ",", []
+    if rows:
+        yield separator + ",".join(rows)
+    yield "]"
+
+
+def stream_todos(queryset: QuerySet) -> StreamingHttpResponse:
+    return StreamingHttpResponse(
+        encode_todos(queryset), content_type="application/json"
+    )
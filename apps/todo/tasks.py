@@ -0,0 +1,117 @@
+import time
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.db import IntegrityError, connection
+from django.utils import timezone
+
+from apps.todo.exports import export_path, write_export
+from apps.todo.hashtag_ids import forget_ids
+from apps.todo.imports import import_path, import_todos, open_import, read_rows
+from apps.todo.models import Hashtag, HashtagUsage, Todo, TodoExport, TodoImport
+
+logger = get_task_logger(__name__)
+
+ORPHAN_BATCH_SIZE = 1000
+ORPHAN_MAX_BATCHES = 100
+
+
+@shared_task
+def export_todos(export_id):
+    export = TodoExport.objects.get(id=export_id)
+    export.status = TodoExport.Status.RUNNING
+    export.save(update_fields=["status"])
+    try:
+        export.rows = write_export(export)
+        export.file = export_path(export).name
+        export.status = TodoExport.Status.DONE
+        logger.info(f"Exported {export.rows} todos for export {export_id}")
+    except Exception as e:
+        export.status = TodoExport.Status.FAILED
+        export.error = str(e)
+        logger.error(f"Export {export_id} failed: {e}")
+        raise
+    finally:
+        export.finished_at = timezone.now()
+        export.save()
+    return export.rows
+
+
+@shared_task
+def import_todos_file(import_id):
+    todo_import = TodoImport.objects.get(id=import_id)
+    todo_import.status = TodoImport.Status.RUNNING
+    todo_import.save(update_fields=["status"])
+
+    def progress(imported, skipped):
+        TodoImport.objects.filter(id=import_id).update(rows=imported)
+
+    try:
+        with open_import(import_path(todo_import)) as lines:
+            todo_import.rows, skipped = import_todos(
+                todo_import.owner_id,
+                read_rows(lines, todo_import.format),
+                progress=progress,
+            )
+        if skipped:
+            todo_import.error = f"skipped {skipped} invalid rows"
+        todo_import.status = TodoImport.Status.DONE
+        logger.info(f"Imported {todo_import.rows} todos for import {import_id}")
+    except Exception as e:
+        todo_import.status = TodoImport.Status.FAILED
+        todo_import.error = str(e)
+        logger.error(f"Import {import_id} failed: {e}")
+        raise
+    finally:
+        todo_import.finished_at = timezone.now()
+        todo_import.save()
+    return todo_import.rows
+
+
+def _delete_orphan_batch(batch_size) -> list[str]:
+    # The anti-join walks the M2M's hashtag_id index; SKIP LOCKED leaves tags
+    # being changed by other transactions to a later run. Their zeroed usage
+    # rows go in the same statement, since the database does not cascade.
+    hashtags = Hashtag._meta.db_table
+    through = Todo.hashtag.through._meta.db_table
+    usage = HashtagUsage._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"WITH orphans AS (SELECT id FROM {hashtags} h WHERE NOT EXISTS ("
+            f"SELECT 1 FROM {through} t WHERE t.hashtag_id = h.id) "
+            "ORDER BY id LIMIT %s FOR UPDATE SKIP LOCKED), "
+            f"usage AS (DELETE FROM {usage} "
+            "WHERE hashtag_id IN (SELECT id FROM orphans)) "
+            f"DELETE FROM {hashtags} WHERE id IN (SELECT id FROM orphans) "
+            "RETURNING name",
+            [batch_size],
+        )
+        return [name for (name,) in cursor.fetchall()]
+
+
+@shared_task
+def delete_orphan_hashtags(
+    batch_size=ORPHAN_BATCH_SIZE, max_batches=ORPHAN_MAX_BATCHES
+):
+    started = time.monotonic()
+    deleted = 0
+    for _ in range(max_batches):
+        try:
+            names = _delete_orphan_batch(batch_size)
+        except IntegrityError:
+            # A todo was tagged with one of the batch's hashtags while it was
+            # being deleted; the batch rolled back and the next run retries.
+            logger.warning("Orphan hashtag batch collided with re-tagging")
+            break
+        forget_ids(names)
+        deleted += len(names)
+        if len(names) < batch_size:
+            break
+    else:
+        delete_orphan_hashtags.apply_async(
+            kwargs={"batch_size": batch_size, "max_batches": max_batches}
+        )
+    logger.info(
+        f"Deleted {deleted} orphaned hashtags in {time.monotonic() - started:.2f}s"
+    )
+    return deleted
@@ -1,9 +1,33 @@
-from uuid import uuid4
+import base64
+import csv
+import gzip
+import json
+from io import StringIO
+from uuid import UUID, uuid4
 
 import pytest
+from django.contrib import admin
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
 
-from apps.todo.models import Hashtag, Todo
+from apps.todo import writes
+from apps.todo.admin import HashtagAdmin, TodoAdmin
+from apps.todo.caching import todo_version
+from apps.todo.exports import export_path
+from apps.todo.hashtag_ids import cached_ids, local_ids, remember_ids
+from apps.todo.imports import import_todos, read_rows
+from apps.todo.models import Hashtag, HashtagUsage, Todo, TodoExport
+from apps.todo.schema import TodoOut, TodoUpdateIn
+from apps.todo.stats import StatsDeltas, todo_stats
+from apps.todo.tasks import (
+    delete_orphan_hashtags,
+    export_todos,
+    import_todos_file,
+)
 from apps.user.models import User
 
 
@@ -236,3 +260,1223 @@ class TestDeleteTodoEndpoint:
         )
 
         assert response.status_code == 404
+
+
+@pytest.mark.django_db
+class TestGetTodosPagination:
+    def test_paginate_walks_all_pages(self, client: Client, user, api_key):
+        client.force_login(user)
+        created = {
+            Todo.objects.create(owner=user, input=f"todo {i}").id for i in range(5)
+        }
+
+        seen = []
+        params = {"limit": 2}
+        while True:
+            response = client.get(
+                "/api/todos/",
+                params,
+                headers={"X-API-Key": api_key},
+                content_type="application/json",
+            )
+            assert response.status_code == 200
+            page = response.json()
+            assert len(page["items"]) <= 2
+            seen.extend(item["id"] for item in page["items"])
+            if page["next"] is None:
+                break
+            params = {"limit": 2, "after": page["next"]}
+
+        assert len(seen) == 5
+        assert {UUID(todo_id) for todo_id in seen} == created
+
+    def test_paginate_last_page_has_no_next(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="Buy milk")
+
+        response = client.get(
+            "/api/todos/",
+            {"limit": 10},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert len(response.json()["items"]) == 1
+        assert response.json()["next"] is None
+
+    def test_paginate_invalid_cursor(self, client: Client, user, api_key):
+        client.force_login(user)
+
+        response = client.get(
+            "/api/todos/",
+            {"limit": 10, "after": "not-a-cursor"},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 400
+        assert response.json() == {"message": "invalid cursor"}
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            ["x", "y"],
+            [3, "00000000-0000-0000-0000-000000000000"],
+            [None, None],
+            {"order": ["created_at", "id"], "values": ["x", "y"]},
+            {
+                "order": ["created_at", "id"],
+                "values": [3, "00000000-0000-0000-0000-000000000000"],
+            },
+            {"order": ["created_at", "id"], "values": [None, None]},
+            {"order": ["created_at", "id"], "values": ["2024-01-01"]},
+        ],
+    )
+    def test_paginate_malformed_cursor_values(self, client: Client, api_key, data):
+        cursor = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        response = client.get(
+            "/api/todos/",
+            {"limit": 10, "after": cursor},
+            headers={"X-API-Key": api_key},
+        )
+
+        assert response.status_code == 400
+        assert response.json() == {"message": "invalid cursor"}
+
+    def test_paginate_cursor_from_other_ordering(self, client: Client, user, api_key):
+        for i in range(3):
+            Todo.objects.create(owner=user, input=f"todo {i}", priority=i)
+        first = client.get(
+            "/api/todos/",
+            {"limit": 1, "order": "priority"},
+            headers={"X-API-Key": api_key},
+        ).json()
+
+        response = client.get(
+            "/api/async/todos/",
+            {"limit": 1, "after": first["next"]},
+            headers={"X-API-Key": api_key},
+        )
+
+        assert response.status_code == 400
+        assert response.json() == {"message": "invalid cursor"}
+
+
+@pytest.mark.django_db
+class TestTodoOutSerialization:
+    def test_list_hashtags_need_no_join(self, user, django_assert_num_queries):
+        hashtag = Hashtag.objects.create(name="grocery")
+        for i in range(5):
+            Todo.objects.create(owner=user, input=f"todo {i}").hashtag.add(hashtag)
+
+        # The names are read from the denormalized column, without a prefetch.
+        with django_assert_num_queries(1):
+            todos = [TodoOut.from_orm(todo) for todo in Todo.objects.filter(owner=user)]
+
+        assert all(todo.hashtags == ["grocery"] for todo in todos)
+
+
+@pytest.mark.django_db
+class TestFulltextSearch:
+    def test_fulltext_matches_word_forms(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="Walk the dogs")
+        Todo.objects.create(owner=user, input="Buy bread")
+
+        response = client.get(
+            "/api/todos/search",
+            {"q": "dog", "mode": "fulltext"},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert [todo["input"] for todo in response.json()] == ["Walk the dogs"]
+
+    def test_fulltext_ranked_and_limited(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="milk")
+        Todo.objects.create(owner=user, input="milk milk and more milk")
+        Todo.objects.create(owner=user, input="milk for the cat")
+
+        response = client.get(
+            "/api/todos/search",
+            {"q": "milk", "mode": "fulltext", "limit": 2},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert len(response.json()) == 2
+        assert response.json()[0]["input"] == "milk milk and more milk"
+
+    def test_search_invalid_mode(self, client: Client, user, api_key):
+        client.force_login(user)
+
+        response = client.get(
+            "/api/todos/search",
+            {"q": "milk", "mode": "regex"},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 422
+
+
+@pytest.mark.django_db
+class TestFuzzySearch:
+    def test_fuzzy_tolerates_typos(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="Call the plumber")
+        Todo.objects.create(owner=user, input="Buy bread")
+
+        response = client.get(
+            "/api/todos/search",
+            {"q": "plumbr", "mode": "fuzzy"},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert [todo["input"] for todo in response.json()] == ["Call the plumber"]
+
+    def test_fuzzy_matches_substrings(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="Buy milk")
+        Todo.objects.create(owner=user, input="Buy bread")
+
+        response = client.get(
+            "/api/todos/search",
+            {"q": "ilk", "mode": "fuzzy"},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert [todo["input"] for todo in response.json()] == ["Buy milk"]
+
+    def test_fuzzy_ordered_by_similarity(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="Buy milk and eggs for the party")
+        Todo.objects.create(owner=user, input="milk")
+
+        response = client.get(
+            "/api/todos/search",
+            {"q": "milk", "mode": "fuzzy", "limit": 1},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert [todo["input"] for todo in response.json()] == ["milk"]
+
+
+@pytest.mark.django_db
+class TestUpdateHashtags:
+    def test_update_hashtags_creates_and_links(self, todo):
+        Hashtag.objects.create(name="grocery")
+
+        todo.update_hashtags(["grocery", "weekly", "grocery"])
+
+        assert sorted(todo.hashtag.values_list("name", flat=True)) == [
+            "grocery",
+            "weekly",
+        ]
+        assert Hashtag.objects.count() == 2
+
+    def test_update_hashtags_replaces_existing(self, todo):
+        todo.update_hashtags(["grocery", "weekly"])
+
+        todo.update_hashtags(["weekly"])
+
+        assert list(todo.hashtag.values_list("name", flat=True)) == ["weekly"]
+
+    def test_update_hashtags_query_count_is_constant(self, user):
+        one, many = [
+            Todo.objects.create(owner=user, input=f"todo {i}") for i in range(2)
+        ]
+
+        with CaptureQueriesContext(connection) as single:
+            one.update_hashtags(["tag"])
+        with CaptureQueriesContext(connection) as multiple:
+            many.update_hashtags([f"tag{i}" for i in range(10)])
+
+        assert len(single) == len(multiple)
+        assert many.hashtag.count() == 10
+
+
+@pytest.mark.django_db
+class TestBulkEndpoint:
+    def test_bulk_mixed_operations(self, client: Client, user, todo, api_key):
+        client.force_login(user)
+        doomed = Todo.objects.create(owner=user, input="Buy bread")
+
+        response = client.post(
+            "/api/todos/bulk",
+            {
+                "create": [
+                    {"input": "Walk the dog", "priority": 3, "hashtag": ["pets"]},
+                    {"input": ""},
+                ],
+                "update": [{"id": str(todo.id), "done": True, "hashtag": ["grocery"]}],
+                "delete": [str(doomed.id)],
+            },
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [(r["action"], r["status"]) for r in results] == [
+            ("create", 201),
+            ("create", 400),
+            ("update", 200),
+            ("delete", 200),
+        ]
+        created = Todo.objects.get(id=results[0]["id"])
+        assert created.priority == 3
+        assert list(created.hashtag.values_list("name", flat=True)) == ["pets"]
+        todo.refresh_from_db()
+        assert todo.done is True
+        assert todo.input == "Buy milk"
+        assert list(todo.hashtag.values_list("name", flat=True)) == ["grocery"]
+        assert not Todo.objects.filter(id=doomed.id).exists()
+
+    def test_bulk_invalid_items_fail_alone(self, client: Client, user, todo, api_key):
+        response = client.post(
+            "/api/todos/bulk",
+            {
+                "create": [
+                    {"input": "Negative", "priority": -1},
+                    {"input": "Huge", "priority": 40000},
+                    {"input": "Long tag", "hashtag": ["x" * 51]},
+                    {"input": "Fine"},
+                ],
+                "update": [
+                    {"id": str(todo.id), "priority": -5},
+                    {"id": str(todo.id), "hashtag": ["y" * 51]},
+                ],
+            },
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert [(r["status"], r["message"]) for r in results] == [
+            (400, "priority is out of range"),
+            (400, "priority is out of range"),
+            (400, "hashtag is too long"),
+            (201, None),
+            (400, "priority is out of range"),
+            (400, "hashtag is too long"),
+        ]
+        assert sorted(
+            Todo.objects.filter(owner=user).values_list("input", "priority")
+        ) == [("Buy milk", 1), ("Fine", 1)]
+
+    def test_bulk_not_owned_items_are_not_found(self, client: Client, user, api_key):
+        client.force_login(user)
+        other_user = User.objects.create(username="otheruser", password="password")
+        other_todo = Todo.objects.create(owner=other_user, input="Buy bread")
+
+        response = client.post(
+            "/api/todos/bulk",
+            {
+                "update": [{"id": str(other_todo.id), "done": True}],
+                "delete": [str(other_todo.id), str(uuid4())],
+            },
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert [r["status"] for r in response.json()["results"]] == [404, 404, 404]
+        other_todo.refresh_from_db()
+        assert other_todo.done is False
+
+    def test_bulk_too_many_items(self, client: Client, user, api_key):
+        client.force_login(user)
+
+        response = client.post(
+            "/api/todos/bulk",
+            {"delete": [str(uuid4()) for _ in range(501)]},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 400
+
+
+@pytest.mark.django_db
+class TestStreamingResponses:
+    def test_stream_todos(self, client: Client, user, api_key, monkeypatch):
+        monkeypatch.setattr("apps.todo.streaming.STREAM_CHUNK_SIZE", 2)
+        client.force_login(user)
+        hashtag = Hashtag.objects.create(name="grocery")
+        for i in range(4):
+            Todo.objects.create(owner=user, input=f"todo {i}").hashtag.add(hashtag)
+
+        response = client.get(
+            "/api/todos/",
+            {"stream": True},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert response.status_code == 200
+        assert response.streaming
+        todos = json.loads(b"".join(response.streaming_content))
+        assert sorted(todo["input"] for todo in todos) == [
+            f"todo {i}" for i in range(4)
+        ]
+        assert all(todo["hashtags"] == ["grocery"] for todo in todos)
+
+    def test_stream_empty_list(self, client: Client, user, api_key):
+        client.force_login(user)
+
+        response = client.get(
+            "/api/todos/",
+            {"stream": True},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        assert json.loads(b"".join(response.streaming_content)) == []
+
+    def test_stream_search(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="Buy milk")
+        Todo.objects.create(owner=user, input="Buy bread")
+
+        response = client.get(
+            "/api/todos/search",
+            {"q": "milk", "stream": True},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        todos = json.loads(b"".join(response.streaming_content))
+        assert [todo["input"] for todo in todos] == ["Buy milk"]
+
+
+@pytest.mark.django_db
+class TestExportEndpoints:
+    @pytest.fixture(autouse=True)
+    def export_root(self, settings, tmp_path):
+        settings.TODO_EXPORT_ROOT = tmp_path
+
+    def start_export(self, client: Client, api_key, export_format):
+        response = client.post(
+            "/api/todos/exports",
+            {"format": export_format},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+        assert response.status_code == 202
+        assert response.json()["status"] == "pending"
+        return response.json()["id"]
+
+    def download(self, client: Client, api_key, export_id):
+        response = client.get(
+            f"/api/todos/exports/{export_id}/download",
+            headers={"X-API-Key": api_key},
+        )
+        assert response.status_code == 200
+        return gzip.decompress(b"".join(response.streaming_content)).decode()
+
+    def test_ndjson_export(self, client: Client, user, todo, api_key):
+        client.force_login(user)
+        todo.update_hashtags(["grocery"])
+        export_id = self.start_export(client, api_key, "ndjson")
+
+        assert export_todos(export_id) == 1
+
+        response = client.get(
+            f"/api/todos/exports/{export_id}",
+            headers={"X-API-Key": api_key},
+        )
+        assert response.json()["status"] == "done"
+        assert response.json()["rows"] == 1
+        rows = [
+            json.loads(line)
+            for line in self.download(client, api_key, export_id).splitlines()
+        ]
+        assert rows[0]["input"] == "Buy milk"
+        assert rows[0]["hashtags"] == ["grocery"]
+
+    def test_csv_export(self, client: Client, user, todo, api_key):
+        client.force_login(user)
+        export_id = self.start_export(client, api_key, "csv")
+
+        export_todos(export_id)
+
+        rows = list(
+            csv.DictReader(self.download(client, api_key, export_id).splitlines())
+        )
+        assert rows[0]["input"] == "Buy milk"
+        assert rows[0]["done"] == "False"
+
+    def test_download_pending_export(self, client: Client, user, api_key):
+        client.force_login(user)
+        export_id = self.start_export(client, api_key, "ndjson")
+
+        response = client.get(
+            f"/api/todos/exports/{export_id}/download",
+            headers={"X-API-Key": api_key},
+        )
+
+        assert response.status_code == 409
+
+    def test_download_missing_file(self, client: Client, user, todo, api_key):
+        client.force_login(user)
+        export_id = self.start_export(client, api_key, "ndjson")
+        export_todos(export_id)
+        export_path(TodoExport.objects.get(id=export_id)).unlink()
+
+        response = client.get(
+            f"/api/todos/exports/{export_id}/download",
+            headers={"X-API-Key": api_key},
+        )
+
+        assert response.status_code == 410
+
+    def test_export_not_owned(self, client: Client, user, api_key):
+        client.force_login(user)
+        other_user = User.objects.create(username="otheruser", password="password")
+        export = TodoExport.objects.create(owner=other_user, format="csv")
+
+        response = client.get(
+            f"/api/todos/exports/{export.id}",
+            headers={"X-API-Key": api_key},
+        )
+
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+class TestImports:
+    NDJSON = (
+        '{"input": "Buy milk", "done": true, "priority": 2, "hashtags": ["grocery"]}\n'
+        '{"input": "Buy bread", "hashtags": ["grocery", "bakery"]}\n'
+        '{"input": ""}\n'
+    )
+
+    @pytest.fixture(autouse=True)
+    def import_root(self, settings, tmp_path):
+        settings.TODO_IMPORT_ROOT = tmp_path
+
+    def test_import_todos_in_batches(self, user):
+        batches = []
+
+        imported, skipped = import_todos(
+            user.id,
+            read_rows(self.NDJSON.splitlines(), "ndjson"),
+            batch_size=2,
+            progress=lambda imported, skipped: batches.append(imported),
+        )
+
+        assert (imported, skipped) == (2, 1)
+        assert batches == [2, 2]
+        milk = Todo.objects.get(owner=user, input="Buy milk")
+        assert milk.done is True
+        assert milk.priority == 2
+        bread = Todo.objects.get(owner=user, input="Buy bread")
+        assert sorted(bread.hashtag.values_list("name", flat=True)) == [
+            "bakery",
+            "grocery",
+        ]
+
+    @pytest.mark.parametrize(
+        "line",
+        [
+            '{"input": "Broken"',
+            '["Buy milk"]',
+            '{"input": 5}',
+            '{"input": "Tagged", "hashtags": [1, 2]}',
+            '{"input": "Tagged", "hashtags": {"a": 1}}',
+            '{"input": "Urgent", "priority": -1}',
+            '{"input": "Urgent", "priority": 40000}',
+        ],
+    )
+    def test_import_skips_invalid_rows(self, user, line):
+        lines = [line, '{"input": "Buy milk"}']
+
+        imported, skipped = import_todos(user.id, read_rows(lines, "ndjson"))
+
+        assert (imported, skipped) == (1, 1)
+        assert Todo.objects.get(owner=user).input == "Buy milk"
+
+    def test_import_endpoint(self, client: Client, user, api_key):
+        client.force_login(user)
+        upload = SimpleUploadedFile("todos.ndjson", self.NDJSON.encode())
+
+        response = client.post(
+            "/api/todos/imports",
+            {"file": upload, "format": "ndjson"},
+            headers={"X-API-Key": api_key},
+        )
+
+        assert response.status_code == 202
+        import_id = response.json()["id"]
+        assert import_todos_file(import_id) == 2
+        response = client.get(
+            f"/api/todos/imports/{import_id}",
+            headers={"X-API-Key": api_key},
+        )
+        assert response.json()["status"] == "done"
+        assert response.json()["rows"] == 2
+        assert Todo.objects.filter(owner=user).count() == 2
+
+    def test_import_command_invalidates_cached_lists(self, user, tmp_path):
+        path = tmp_path / "todos.ndjson"
+        path.write_text(self.NDJSON)
+        version = todo_version(user.id)
+
+        call_command("import_todos", user.username, path, stdout=StringIO())
+
+        assert todo_version(user.id) != version
+
+    def test_import_command_reads_gzipped_csv(self, user, tmp_path):
+        path = tmp_path / "todos.csv.gz"
+        with gzip.open(path, "wt", newline="") as output:
+            writer = csv.writer(output)
+            writer.writerow(["input", "done", "priority", "hashtags"])
+            writer.writerow(["Buy milk", "False", "3", "grocery weekly"])
+
+        call_command(
+            "import_todos", user.username, path, format="csv", stdout=StringIO()
+        )
+
+        todo = Todo.objects.get(owner=user)
+        assert todo.priority == 3
+        assert sorted(todo.hashtag.values_list("name", flat=True)) == [
+            "grocery",
+            "weekly",
+        ]
+
+
+@pytest.mark.django_db
+class TestGetTodosFiltering:
+    @pytest.fixture
+    def todos(self, user):
+        return [
+            Todo.objects.create(owner=user, input="low", priority=1),
+            Todo.objects.create(owner=user, input="high", priority=5),
+            Todo.objects.create(owner=user, input="mid", priority=3),
+            Todo.objects.create(owner=user, input="done", priority=4, done=True),
+        ]
+
+    def get(self, client: Client, api_key, params):
+        return client.get(
+            "/api/todos/",
+            params,
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+    def test_filter_and_order(self, client: Client, user, api_key, todos):
+        client.force_login(user)
+
+        response = self.get(
+            client,
+            api_key,
+            {"done": False, "priority__gte": 2, "order": "-priority,created_at"},
+        )
+
+        assert response.status_code == 200
+        assert [todo["input"] for todo in response.json()] == ["high", "mid"]
+
+    def test_paginate_with_order(self, client: Client, user, api_key, todos):
+        client.force_login(user)
+
+        first = self.get(client, api_key, {"order": "-priority", "limit": 2}).json()
+        second = self.get(
+            client,
+            api_key,
+            {"order": "-priority", "limit": 2, "after": first["next"]},
+        ).json()
+
+        assert [todo["input"] for todo in first["items"] + second["items"]] == [
+            "high",
+            "done",
+            "mid",
+            "low",
+        ]
+        assert second["next"] is None
+
+    def test_invalid_order(self, client: Client, user, api_key):
+        client.force_login(user)
+
+        response = self.get(client, api_key, {"order": "input"})
+
+        assert response.status_code == 400
+        assert response.json() == {"message": "invalid order: input"}
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+    def get(self, client: Client, api_key, path="/api/todos/", **headers):
+        return client.get(path, headers={"X-API-Key": api_key, **headers})
+
+    def test_etag_returns_not_modified(self, client: Client, user, todo, api_key):
+        client.force_login(user)
+        etag = self.get(client, api_key)["ETag"]
+
+        response = self.get(client, api_key, **{"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+
+    def test_not_modified_skips_todo_queries(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="Buy milk")
+        etag = self.get(client, api_key)["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get(client, api_key, **{"If-None-Match": etag})
+
+        assert response.status_code == 304
+        assert not any("todo_todo" in query["sql"] for query in queries)
+
+    def test_etag_changes_after_write(self, client: Client, user, todo, api_key):
+        client.force_login(user)
+        etag = self.get(client, api_key)["ETag"]
+
+        client.patch(
+            f"/api/todos/{todo.id}",
+            {"done": True},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+        response = self.get(client, api_key, **{"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+        assert response.json()[0]["done"] is True
+
+    def test_etag_depends_on_query(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="Buy milk")
+
+        etag = self.get(client, api_key, "/api/todos/search?q=milk")["ETag"]
+        response = self.get(
+            client, api_key, "/api/todos/search?q=bread", **{"If-None-Match": etag}
+        )
+
+        assert response.status_code == 200
+        assert response.json() == []
+
+
+@pytest.mark.django_db
+class TestResponseCache:
+    def get(self, client: Client, api_key, path="/api/todos/"):
+        return client.get(path, headers={"X-API-Key": api_key})
+
+    def test_cached_list_skips_todo_queries(self, client: Client, user, api_key):
+        client.force_login(user)
+        Todo.objects.create(owner=user, input="Buy milk")
+        first = self.get(client, api_key)
+
+        with CaptureQueriesContext(connection) as queries:
+            second = self.get(client, api_key)
+
+        assert second.status_code == 200
+        assert second.json() == first.json()
+        assert not any("todo_todo" in query["sql"] for query in queries)
+
+    def test_write_through_api_invalidates(self, client: Client, user, api_key):
+        client.force_login(user)
+        self.get(client, api_key, "/api/todos/search?q=milk")
+
+        client.post(
+            "/api/todos/",
+            {"input": "Buy milk"},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+        response = self.get(client, api_key, "/api/todos/search?q=milk")
+
+        assert [todo["input"] for todo in response.json()] == ["Buy milk"]
+
+    def test_admin_hashtag_rename_invalidates(
+        self,
+        client: Client,
+        user,
+        todo,
+        api_key,
+        rf,
+        django_capture_on_commit_callbacks,
+    ):
+        client.force_login(user)
+        todo.update_hashtags(["grocery"])
+        self.get(client, api_key)
+        hashtag = Hashtag.objects.get(name="grocery")
+        hashtag.name = "groceries"
+
+        with django_capture_on_commit_callbacks(execute=True):
+            HashtagAdmin(Hashtag, admin.site).save_model(
+                rf.post("/"), hashtag, None, True
+            )
+        response = self.get(client, api_key)
+
+        assert response.json()[0]["hashtags"] == ["groceries"]
+
+    def test_admin_delete_invalidates(
+        self,
+        client: Client,
+        user,
+        todo,
+        api_key,
+        rf,
+        django_capture_on_commit_callbacks,
+    ):
+        client.force_login(user)
+        self.get(client, api_key)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            TodoAdmin(Todo, admin.site).delete_model(rf.post("/"), todo)
+        response = self.get(client, api_key)
+
+        assert response.json() == []
+
+    @pytest.mark.parametrize("method", ["delete_model", "delete_queryset"])
+    def test_admin_bumps_version_after_commit(
+        self, user, todo, rf, method, django_capture_on_commit_callbacks
+    ):
+        todo.update_hashtags(["grocery"])
+        hashtag = Hashtag.objects.get(name="grocery")
+        other = Todo.objects.create(owner=user, input="Walk dog")
+        version = todo_version(user.id)
+        todo_admin = TodoAdmin(Todo, admin.site)
+        hashtag_admin = HashtagAdmin(Hashtag, admin.site)
+
+        with django_capture_on_commit_callbacks(execute=False) as callbacks:
+            getattr(hashtag_admin, method)(
+                rf.post("/"),
+                hashtag if method == "delete_model" else Hashtag.objects.all(),
+            )
+            getattr(todo_admin, method)(
+                rf.post("/"),
+                other if method == "delete_model" else Todo.objects.filter(id=other.id),
+            )
+            assert todo_version(user.id) == version
+
+        for callback in callbacks:
+            callback()
+        assert todo_version(user.id) != version
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAsyncTodoApi:
+    def request(self, client: Client, method, path, api_key, data=None):
+        return getattr(client, method)(
+            f"/api/async/todos/{path}",
+            data,
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+    def test_create_edit_and_list(self, client: Client, user, api_key):
+        created = self.request(client, "post", "", api_key, {"input": "Buy milk"})
+        todo_id = created.json()["id"]
+
+        edited = self.request(
+            client,
+            "patch",
+            todo_id,
+            api_key,
+            {"done": True, "hashtag": ["grocery", "home"]},
+        )
+        listed = self.request(client, "get", "", api_key)
+
+        assert created.status_code == 200
+        assert edited.json()["done"] is True
+        assert sorted(edited.json()["hashtags"]) == ["grocery", "home"]
+        assert listed.json() == [edited.json()]
+
+    def test_search_and_paginate(self, client: Client, user, api_key):
+        for text in ("Buy milk", "Buy bread", "Walk dog"):
+            Todo.objects.create(owner=user, input=text)
+
+        found = self.request(client, "get", "search?q=buy", api_key)
+        page = self.request(client, "get", "?limit=2", api_key)
+
+        assert {todo["input"] for todo in found.json()} == {"Buy milk", "Buy bread"}
+        assert len(page.json()["items"]) == 2
+        assert page.json()["next"]
+
+    def test_delete_and_not_found(self, client: Client, user, todo, api_key):
+        deleted = self.request(client, "delete", str(todo.id), api_key)
+        missing = self.request(client, "delete", str(todo.id), api_key)
+
+        assert deleted.json() == {"message": "deleted"}
+        assert missing.status_code == 404
+        assert not Todo.objects.filter(id=todo.id).exists()
+
+    def test_unauthenticated(self, client: Client):
+        response = client.get("/api/async/todos/", headers={"X-API-Key": "bad.key"})
+
+        assert response.status_code == 401
+
+    def test_bench_command(self, user):
+        out = StringIO()
+
+        call_command("bench_api", requests=4, concurrency=2, todos=3, stdout=out)
+
+        assert "sync:" in out.getvalue()
+        assert "async:" in out.getvalue()
+
+
+@pytest.mark.django_db
+class TestHashtagNames:
+    def search(self, client: Client, api_key, **params):
+        return client.get(
+            "/api/todos/search", params, headers={"X-API-Key": api_key}
+        ).json()
+
+    def test_kept_in_sync_with_m2m(self, user, todo):
+        todo.update_hashtags(["home", "grocery", "home"])
+        assert todo.hashtag_names == ["grocery", "home"]
+        todo.refresh_from_db()
+        assert todo.hashtag_names == ["grocery", "home"]
+
+        todo.hashtag.remove(Hashtag.objects.get(name="home"))
+        Hashtag.objects.get(name="grocery").todos.clear()
+        todo.refresh_from_db()
+
+        assert todo.hashtag_names == []
+
+    def test_match_any_and_all_without_join(self, client: Client, user, api_key):
+        Todo.objects.create(owner=user, input="Buy milk").update_hashtags(
+            ["grocery", "home"]
+        )
+        Todo.objects.create(owner=user, input="Buy bread").update_hashtags(["grocery"])
+        Todo.objects.create(owner=user, input="Walk dog")
+
+        any_of = self.search(client, api_key, hashtags="home,grocery")
+        all_of = self.search(client, api_key, hashtags="home,grocery", match="all")
+        sql = str(Todo.objects.search(hashtags=["home"], match="all").query)
+
+        assert {todo["input"] for todo in any_of} == {"Buy milk", "Buy bread"}
+        assert [todo["input"] for todo in all_of] == ["Buy milk"]
+        assert all_of[0]["hashtags"] == ["grocery", "home"]
+        assert "@>" in sql
+        assert "todo_todo_hashtag" not in sql and "DISTINCT" not in sql
+
+    def test_bulk_and_import_set_names(self, client: Client, user, api_key):
+        client.post(
+            "/api/todos/bulk",
+            {"create": [{"input": "Buy milk", "hashtag": ["home", "grocery"]}]},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+        import_todos(user.id, [{"input": "Walk dog", "hashtags": ["pets"]}])
+
+        names = dict(Todo.objects.values_list("input", "hashtag_names"))
+
+        assert names == {"Buy milk": ["grocery", "home"], "Walk dog": ["pets"]}
+
+    def test_admin_rename_and_delete_rewrite_names(self, user, todo, rf):
+        todo.update_hashtags(["grocery", "home"])
+        hashtag = Hashtag.objects.get(name="grocery")
+        hashtag.name = "shopping"
+        hashtag_admin = HashtagAdmin(Hashtag, admin.site)
+
+        hashtag_admin.save_model(rf.post("/"), hashtag, None, True)
+        todo.refresh_from_db()
+        assert todo.hashtag_names == ["home", "shopping"]
+
+        hashtag_admin.delete_model(rf.post("/"), hashtag)
+        todo.refresh_from_db()
+        assert todo.hashtag_names == ["home"]
+
+
+class CounterTests:
+    """Helpers comparing the maintained counters with a recount of the todos."""
+
+    def call(self, client: Client, method, path, api_key, data=None):
+        return getattr(client, method)(
+            f"/api/todos/{path}",
+            data,
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+    def recomputed_stats(self, user):
+        todos = Todo.objects.filter(owner=user)
+        return {
+            "total": todos.count(),
+            "done": todos.filter(done=True).count(),
+            "pending": todos.filter(done=False).count(),
+        }
+
+    def recomputed_usage(self, user):
+        return dict(
+            Hashtag.objects.filter(todos__owner=user)
+            .annotate(count=Count("todos"))
+            .values_list("name", "count")
+        )
+
+    def usage(self, user):
+        return dict(
+            HashtagUsage.objects.filter(owner=user, count__gt=0).values_list(
+                "hashtag__name", "count"
+            )
+        )
+
+
+@pytest.mark.django_db
+class TestTodoStats(CounterTests):
+
+    def test_counters_follow_every_write(self, client: Client, user, api_key):
+        first = self.call(client, "post", "", api_key, {"input": "Buy milk"}).json()
+        self.call(client, "post", "", api_key, {"input": "Walk dog"})
+        self.call(client, "patch", first["id"], api_key, {"done": True, "priority": 3})
+        created = self.call(
+            client,
+            "post",
+            "bulk",
+            api_key,
+            {
+                "create": [{"input": "Read", "done": True}, {"input": "Cook"}],
+                "update": [{"id": first["id"], "done": False}],
+            },
+        ).json()["results"]
+        self.call(client, "post", "bulk", api_key, {"delete": [created[0]["id"]]})
+        import_todos(user.id, [{"input": "Call mom", "done": True, "priority": 2}])
+
+        stats = todo_stats(user)
+
+        assert {key: stats[key] for key in ("total", "done", "pending")} == (
+            self.recomputed_stats(user)
+        )
+        assert stats["by_priority"] == [
+            {"priority": 1, "total": 2, "done": 0, "pending": 2},
+            {"priority": 2, "total": 1, "done": 1, "pending": 0},
+            {"priority": 3, "total": 1, "done": 0, "pending": 1},
+        ]
+
+    def test_delete_and_admin_paths(self, client: Client, user, todo, api_key, rf):
+        other = Todo.objects.create(owner=user, input="Walk dog")
+        todo_admin = TodoAdmin(Todo, admin.site)
+        todo_admin.save_model(rf.post("/"), other, None, False)
+        todo.done = True
+        todo_admin.save_model(rf.post("/"), todo, None, True)
+        assert todo_stats(user)["done"] == 1
+
+        todo_admin.delete_queryset(rf.post("/"), Todo.objects.filter(id=todo.id))
+        self.call(client, "delete", str(other.id), api_key)
+
+        assert todo_stats(user)["total"] == 0
+
+    def test_endpoint(self, client: Client, user, api_key):
+        self.call(client, "post", "", api_key, {"input": "Buy milk"})
+
+        response = self.call(client, "get", "stats", api_key)
+
+        assert response.status_code == 200
+        assert response.json() == {
+            "total": 1,
+            "done": 0,
+            "pending": 1,
+            "by_priority": [{"priority": 1, "total": 1, "done": 0, "pending": 1}],
+        }
+        assert response.headers["ETag"]
+
+
+@pytest.mark.django_db
+class TestHashtagUsage(CounterTests):
+
+    def test_counts_follow_every_write(self, client: Client, user, api_key):
+        first = self.call(client, "post", "", api_key, {"input": "Buy milk"}).json()
+        self.call(client, "patch", first["id"], api_key, {"hashtag": ["home", "shop"]})
+        created = self.call(
+            client,
+            "post",
+            "bulk",
+            api_key,
+            {
+                "create": [
+                    {"input": "Read", "hashtag": ["home", "home"]},
+                    {"input": "Cook", "hashtag": ["home", "food"]},
+                ],
+                "update": [{"id": first["id"], "hashtag": ["shop", "food"]}],
+            },
+        ).json()["results"]
+        self.call(client, "post", "bulk", api_key, {"delete": [created[0]["id"]]})
+        self.call(client, "delete", created[1]["id"], api_key)
+        import_todos(user.id, [{"input": "Call mom", "hashtags": "home family"}])
+
+        usage = self.usage(user)
+
+        assert usage == self.recomputed_usage(user)
+        assert usage == {"shop": 1, "food": 1, "home": 1, "family": 1}
+
+    def test_update_hashtags_maintains_counts(self, user, todo):
+        todo.update_hashtags(["home", "shop", "home"])
+        todo.save()
+        Todo.objects.get(id=todo.id).update_hashtags(["shop", "food"])
+
+        assert self.usage(user) == self.recomputed_usage(user)
+        assert self.usage(user) == {"shop": 1, "food": 1}
+
+    def test_admin_delete(self, user, todo, rf):
+        todo.update_hashtags(["home"])
+
+        TodoAdmin(Todo, admin.site).delete_queryset(
+            rf.post("/"), Todo.objects.filter(id=todo.id)
+        )
+
+        assert HashtagUsage.objects.get(owner=user).count == 0
+
+    def test_top_k(self, client: Client, user, api_key):
+        self.call(
+            client,
+            "post",
+            "bulk",
+            api_key,
+            {
+                "create": [
+                    {"input": "a", "hashtag": ["work"]},
+                    {"input": "b", "hashtag": ["work", "home"]},
+                    {"input": "c", "hashtag": ["work", "home", "gym"]},
+                ]
+            },
+        )
+
+        response = self.call(client, "get", "hashtags?limit=2", api_key)
+        async_response = client.get(
+            "/api/async/todos/hashtags", headers={"X-API-Key": api_key}
+        )
+
+        assert response.status_code == 200
+        assert response.json() == [
+            {"name": "work", "count": 3},
+            {"name": "home", "count": 2},
+        ]
+        assert [tag["name"] for tag in async_response.json()] == [
+            "work",
+            "home",
+            "gym",
+        ]
+
+
+@pytest.mark.django_db
+class TestHashtagSuggest:
+    def test_suggest(self, client: Client, user, api_key):
+        other = User.objects.create_user(username="other", password="secret")
+        tags = {"work": 3, "workout": 1, "word": 2, "home": 4, "wo_x": 1}
+        stats = StatsDeltas()
+        for todo_owner in (user, other):
+            for name, count in tags.items():
+                Hashtag.objects.get_or_create(name=name)
+                stats.tag(todo_owner.id, [name], count if todo_owner == user else 9)
+        stats.tag(other.id, ["worst"])
+        Hashtag.objects.create(name="worst")
+        stats.save()
+
+        response = client.get(
+            "/api/todos/hashtags/suggest?prefix=wor&limit=2",
+            headers={"X-API-Key": api_key},
+        )
+        escaped = client.get(
+            "/api/async/todos/hashtags/suggest?prefix=wo_",
+            headers={"X-API-Key": api_key},
+        )
+
+        assert response.status_code == 200
+        assert response.json() == [
+            {"name": "work", "count": 3},
+            {"name": "word", "count": 2},
+        ]
+        assert escaped.json() == [{"name": "wo_x", "count": 1}]
+
+
+@pytest.mark.django_db
+class TestHashtagIdCache:
+    def test_known_names_skip_the_database(
+        self, django_assert_num_queries, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            ids = Hashtag.get_or_create_ids(["home", "work"])
+
+        with django_assert_num_queries(0):
+            assert Hashtag.get_or_create_ids(["work", "home"]) == ids
+        local_ids.clear()
+        with django_assert_num_queries(0):
+            assert Hashtag.get_ids(["home", "work"]) == ids
+
+    def test_existing_names_are_returned_by_the_insert(self, django_assert_num_queries):
+        home = Hashtag.objects.create(name="home")
+
+        with django_assert_num_queries(1):
+            ids = Hashtag.get_or_create_ids(["home", "work"])
+
+        assert ids == {"home": home.id, "work": Hashtag.objects.get(name="work").id}
+
+    def test_rolled_back_ids_are_not_cached(self, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            with pytest.raises(DatabaseError), transaction.atomic():
+                Hashtag.get_or_create_ids(["home"])
+                raise DatabaseError
+
+        assert cached_ids(["home"]) == {}
+
+    def test_stale_id_is_retried(self, user, todo, django_capture_on_commit_callbacks):
+        remember_ids({"home": 10**9})
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            writes.edit_todo(user, todo.id, TodoUpdateIn(hashtag=["home"]))
+
+        hashtag = Hashtag.objects.get(name="home")
+        assert list(todo.hashtag.all()) == [hashtag]
+        assert cached_ids(["home"]) == {"home": hashtag.id}
+
+    def test_delete_forgets_id(self, django_capture_on_commit_callbacks):
+        Hashtag.get_or_create_ids(["home"])
+
+        with django_capture_on_commit_callbacks(execute=True):
+            Hashtag.objects.filter(name="home").delete()
+
+        assert cached_ids(["home"]) == {}
+
+
+@pytest.mark.django_db
+class TestDeleteOrphanHashtags:
+    @pytest.fixture
+    def hashtags(self, user, todo, django_capture_on_commit_callbacks):
+        with django_capture_on_commit_callbacks(execute=True):
+            writes.edit_todo(user, todo.id, TodoUpdateIn(hashtag=["home", "work"]))
+            writes.edit_todo(user, todo.id, TodoUpdateIn(hashtag=["home"]))
+        Hashtag.objects.create(name="unused")
+
+    def test_deletes_orphans_in_batches(self, hashtags, monkeypatch):
+        resumed = []
+        monkeypatch.setattr(
+            delete_orphan_hashtags, "apply_async", lambda **kw: resumed.append(kw)
+        )
+
+        assert delete_orphan_hashtags(batch_size=1) == 2
+
+        assert list(Hashtag.objects.values_list("name", flat=True)) == ["home"]
+        assert list(HashtagUsage.objects.values_list("hashtag__name", "count")) == [
+            ("home", 1)
+        ]
+        assert cached_ids(["home", "work"]).keys() == {"home"}
+        assert resumed == []
+
+    def test_resumes_when_batches_run_out(self, hashtags, monkeypatch):
+        resumed = []
+        monkeypatch.setattr(
+            delete_orphan_hashtags, "apply_async", lambda **kw: resumed.append(kw)
+        )
+
+        assert delete_orphan_hashtags(batch_size=1, max_batches=1) == 1
+
+        assert Hashtag.objects.count() == 2
+        assert resumed == [{"kwargs": {"batch_size": 1, "max_batches": 1}}]
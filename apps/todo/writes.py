@@ -0,0 +1,47 @@
+from django.db import transaction
+
+from apps.todo.hashtag_ids import retry_stale_ids
+from apps.todo.models import Todo
+from apps.todo.schema import TodoUpdateIn
+from apps.todo.stats import StatsDeltas
+
+# Each write changes the todo and its owner's counters in one transaction.
+
+
+@transaction.atomic
+def create_todo(owner, input: str) -> Todo:
+    todo = Todo.objects.create(input=input, owner=owner)
+    StatsDeltas().add(todo).save()
+    return todo
+
+
+@retry_stale_ids
+@transaction.atomic
+def edit_todo(owner, todo_id, changes: TodoUpdateIn) -> Todo:
+    # The row lock keeps concurrent edits from counting the same old state.
+    todo = Todo.objects.select_for_update().get(id=todo_id, owner=owner)
+    stats = StatsDeltas().remove(todo)
+    if changes.input is not None:
+        todo.input = changes.input
+    if changes.done is not None:
+        todo.done = changes.done
+    if changes.priority is not None:
+        todo.priority = changes.priority
+    # Added before the tags change, which update_hashtags counts itself.
+    stats.add(todo)
+    if changes.hashtag is not None:
+        todo.update_hashtags(changes.hashtag)
+    todo.save()
+    stats.save()
+    return todo
+
+
+@retry_stale_ids
+@transaction.atomic
+def delete_todo(owner, todo_id) -> bool:
+    todo = Todo.objects.select_for_update().filter(id=todo_id, owner=owner).first()
+    if todo is None:
+        return False
+    todo.delete()
+    StatsDeltas().remove(todo).save()
+    return True
@@ -1,16 +1,22 @@
-from datetime import timedelta
-
-from django.contrib.auth import authenticate
 from django.db import IntegrityError
 from django.shortcuts import Http404
 from django.utils import timezone
 from ninja import Router
 from ninja_apikey.models import APIKey
-from ninja_apikey.security import APIKeyAuth, generate_key
+from ninja_apikey.security import APIKeyAuth
 
+from apps.user.apikeys import invalidate_api_key, issue_login_key
+from apps.user.hashing import authenticate_user, hash_password
 from apps.user.models import User
+from apps.user.provisioning import (
+    MAX_PROVISION_ITEMS,
+    duplicate_field,
+    provision_users,
+)
 from apps.user.schema import (
     Message,
+    UserBulkIn,
+    UserBulkOut,
     UserIn,
     UserOut,
     UserSignIn,
@@ -22,34 +28,40 @@ from apps.user.schema import (
 auth = APIKeyAuth()
 router = Router()
 
+SIGNUP_CONFLICTS = {
+    "email": "message: Email address is already registered.",
+    "username": "message: username is already registered.",
+}
+
 
 @router.post("/", auth=None, response={200: UserSignUpOut, 409: Message})
 def signup(request, userInfo: UserIn):
-    if User.objects.filter(email=userInfo.email).exists():
-        return 409, Message(message="message: Email address is already registered.")
     try:
-        user = User.objects.create(username=userInfo.username, email=userInfo.email)
-    except IntegrityError:
-        return 409, Message(message="message: username is already registered.")
-    user.set_password(userInfo.password)
-    user.save()
+        user = User.objects.create(
+            username=userInfo.username,
+            email=userInfo.email,
+            password=hash_password(userInfo.password),
+        )
+    except IntegrityError as e:
+        return 409, Message(message=SIGNUP_CONFLICTS[duplicate_field(e)])
     return UserSignUpOut.from_orm(user)
 
 
+@router.post("/bulk", response={200: UserBulkOut, 400: Message, 403: Message})
+def provision(request, payload: UserBulkIn):
+    if not request.user.is_staff:
+        return 403, Message(message="Only staff can provision users.")
+    if len(payload.users) > MAX_PROVISION_ITEMS:
+        return 400, Message(message=f"at most {MAX_PROVISION_ITEMS} users per request")
+    return UserBulkOut(results=provision_users(payload.users))
+
+
 @router.post("/login", auth=None, response={200: UserOut, 401: Message})
 def login(request, userInfo: UserSignIn):
-    user = authenticate(request, username=userInfo.username, password=userInfo.password)
+    user = authenticate_user(userInfo.username, userInfo.password)
     if user is None:
         return 401, Message(message="Unauthorized")
-    key = generate_key()
-    APIKey.objects.create(
-        prefix=key.prefix,
-        hashed_key=key.hashed_key,
-        user=user,
-        label="login",
-        expires_at=timezone.now() + timedelta(days=30),
-    )
-    token = f"{key.prefix}.{key.key}"
+    token = issue_login_key(user, userInfo.device)
     user.last_login = timezone.now()
     user.save()
     return UserOut(
@@ -71,8 +83,10 @@ def logout(request):
     if len(data) < 2:
         return 401, Message(message="Invalid API key format")
     prefix = data[0]
-    user_APIkey = APIKey.objects.filter(prefix=prefix).first()
-    user_APIkey.delete()
+    # The key may already be gone if this request was authenticated from
+    # another process's local cache.
+    APIKey.objects.filter(prefix=prefix).delete()
+    invalidate_api_key(prefix)
     return 200, Message(message="successful")
 
 
@@ -92,7 +106,7 @@ def user_update(request, newInfo: UserUpdateIn):
     if newInfo.username is not None:
         user.username = newInfo.username
     if newInfo.password is not None:
-        user.set_password(newInfo.password)
+        user.password = hash_password(newInfo.password)
     try:
         user.save()
     except IntegrityError:
@@ -0,0 +1,295 @@
+import hashlib
+import hmac
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from ninja_apikey.models import APIKey
+from ninja_apikey.security import generate_key
+
+from apps.user.hashing import hashing_pool
+from apps.user.models import User
+from todo_app.local_cache import LocalKeyCache
+
+CACHE_KEY = "apikey:{}"
+REVOKED_KEY = "apikey:revoked:{}"
+TOUCH_KEY = "apikey:touched:{}"
+
+
+class PendingRefreshes:
+    """Prefixes whose expiry should be extended, buffered until a batch is due."""
+
+    def __init__(self):
+        self._prefixes = set()
+        self._since = None
+        self._lock = threading.Lock()
+
+    def add(self, prefix, batch_size: int, max_age: float) -> list[str]:
+        with self._lock:
+            if not self._prefixes:
+                self._since = time.monotonic()
+            self._prefixes.add(prefix)
+            if (
+                len(self._prefixes) < batch_size
+                and time.monotonic() - self._since < max_age
+            ):
+                return []
+        return self.drain()
+
+    def overdue(self, max_age: float) -> list[str]:
+        with self._lock:
+            if not self._prefixes or time.monotonic() - self._since < max_age:
+                return []
+        return self.drain()
+
+    def drain(self) -> list[str]:
+        with self._lock:
+            prefixes, self._prefixes = sorted(self._prefixes), set()
+            return prefixes
+
+
+local_keys = LocalKeyCache(getattr(settings, "API_KEY_LOCAL_CACHE_SIZE", 1024))
+pending_refreshes = PendingRefreshes()
+
+
+def sliding_expiry():
+    days = getattr(settings, "API_KEY_EXPIRATION_DAYS", 30)
+    return timezone.now() + timedelta(days=days)
+
+
+def _digest(key: str) -> str:
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _split(key: str):
+    prefix, _, secret = key.partition(".")
+    return prefix if secret else None
+
+
+def _local_timeout() -> float:
+    return getattr(settings, "API_KEY_LOCAL_CACHE_TIMEOUT", 5)
+
+
+def _verified_user(entry, key: str):
+    digest, user_id, is_staff, expires_at = entry
+    if not hmac.compare_digest(digest, _digest(key)):
+        return None
+    if expires_at is not None and expires_at < timezone.now():
+        return None
+    # Only active users are cached and saving a user drops its keys, so the
+    # request needs no query; any other field is loaded on first access.
+    state = {"id": user_id, "is_active": True, "is_staff": is_staff}
+    # from_db() takes the values in the model's field order.
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in state]
+    return User.from_db(None, fields, [state[name] for name in fields])
+
+
+def get_cached_user(key: str):
+    """
+    Return the user of an already verified key, or None on a miss.
+
+    Entries hold a SHA-256 of the full key, so a cached prefix never
+    authenticates a different secret.
+    """
+    prefix = _split(key)
+    if prefix is None:
+        return None
+    entry = local_keys.get(prefix)
+    if entry is not None and cache.get(REVOKED_KEY.format(prefix)):
+        # Invalidated in another process since this copy was taken.
+        local_keys.delete(prefix)
+        entry = None
+    if entry is None:
+        entry = cache.get(CACHE_KEY.format(prefix))
+        if entry is None:
+            return None
+        local_keys.set(prefix, entry, _local_timeout())
+    return _verified_user(entry, key)
+
+
+async def aget_cached_user(key: str):
+    prefix = _split(key)
+    if prefix is None:
+        return None
+    entry = local_keys.get(prefix)
+    if entry is not None and await cache.aget(REVOKED_KEY.format(prefix)):
+        local_keys.delete(prefix)
+        entry = None
+    if entry is None:
+        entry = await cache.aget(CACHE_KEY.format(prefix))
+        if entry is None:
+            return None
+        local_keys.set(prefix, entry, _local_timeout())
+    return _verified_user(entry, key)
+
+
+def _cache_entry(key: str, user, expires_at):
+    prefix = _split(key)
+    if prefix is None:
+        return None
+    timeout = getattr(settings, "API_KEY_CACHE_TIMEOUT", 60)
+    if expires_at is not None:
+        timeout = min(timeout, (expires_at - timezone.now()).total_seconds())
+    if timeout <= 0:
+        return None
+    # The shared entry never outlives the key, so expired keys simply miss.
+    entry = (_digest(key), user.pk, user.is_staff, expires_at)
+    local_keys.set(prefix, entry, min(timeout, _local_timeout()))
+    return CACHE_KEY.format(prefix), entry, timeout
+
+
+def cache_api_key(key: str, user, expires_at):
+    if shared := _cache_entry(key, user, expires_at):
+        cache.set(*shared)
+
+
+async def acache_api_key(key: str, user, expires_at):
+    if shared := _cache_entry(key, user, expires_at):
+        await cache.aset(*shared)
+
+
+def extend_api_keys(prefixes: list[str]) -> int:
+    return APIKey.objects.filter(prefix__in=prefixes, revoked=False).update(
+        expires_at=sliding_expiry()
+    )
+
+
+def _refresh_in_celery() -> bool:
+    return getattr(settings, "API_KEY_REFRESH_MODE", "inline") == "celery"
+
+
+def flush_api_key_refreshes(prefixes: list[str] | None = None):
+    prefixes = pending_refreshes.drain() if prefixes is None else prefixes
+    if not prefixes:
+        return
+    if _refresh_in_celery():
+        from apps.user.tasks import refresh_api_keys
+
+        refresh_api_keys.delay(prefixes)
+    else:
+        extend_api_keys(prefixes)
+
+
+async def aflush_api_key_refreshes(prefixes: list[str] | None = None):
+    prefixes = pending_refreshes.drain() if prefixes is None else prefixes
+    if not prefixes:
+        return
+    if _refresh_in_celery():
+        from apps.user.tasks import refresh_api_keys
+
+        await sync_to_async(refresh_api_keys.delay)(prefixes)
+    else:
+        await APIKey.objects.filter(prefix__in=prefixes, revoked=False).aupdate(
+            expires_at=sliding_expiry()
+        )
+
+
+def touch_api_key(prefix: str):
+    """
+    Record activity on a key for the sliding expiration.
+
+    A key is extended at most once per API_KEY_REFRESH_INTERVAL across all
+    processes, and extensions are written in batches of up to
+    API_KEY_REFRESH_BATCH_SIZE keys with a single UPDATE, either in the request
+    that fills the batch or by a Celery task in ``celery`` mode. Every
+    authenticated request also flushes a buffer older than the interval, so
+    while a process serves traffic expiry lags real activity by at most
+    twice the interval; an idle process keeps its buffer until its next
+    request.
+    """
+    interval = getattr(settings, "API_KEY_REFRESH_INTERVAL", 60)
+    if not cache.add(TOUCH_KEY.format(prefix), 1, interval):
+        flush_api_key_refreshes(pending_refreshes.overdue(interval))
+        return
+    batch_size = getattr(settings, "API_KEY_REFRESH_BATCH_SIZE", 100)
+    flush_api_key_refreshes(pending_refreshes.add(prefix, batch_size, interval))
+
+
+async def atouch_api_key(prefix: str):
+    interval = getattr(settings, "API_KEY_REFRESH_INTERVAL", 60)
+    if not await cache.aadd(TOUCH_KEY.format(prefix), 1, interval):
+        await aflush_api_key_refreshes(pending_refreshes.overdue(interval))
+        return
+    batch_size = getattr(settings, "API_KEY_REFRESH_BATCH_SIZE", 100)
+    await aflush_api_key_refreshes(pending_refreshes.add(prefix, batch_size, interval))
+
+
+def issue_login_key(user, label: str) -> str:
+    """
+    Return a token for ``user`` on the device ``label``.
+
+    In ``rotate`` mode each (user, label) keeps at most
+    API_KEY_MAX_PER_DEVICE active keys: once the limit is reached the key
+    closest to expiry is re-keyed in place instead of inserting a row, and
+    expired, revoked or surplus keys of that device are deleted.
+    """
+    key = hashing_pool.run(generate_key)
+    if getattr(settings, "API_KEY_LOGIN_MODE", "rotate") != "rotate":
+        APIKey.objects.create(
+            prefix=key.prefix,
+            hashed_key=key.hashed_key,
+            user=user,
+            label=label,
+            expires_at=sliding_expiry(),
+        )
+        return f"{key.prefix}.{key.key}"
+
+    limit = max(getattr(settings, "API_KEY_MAX_PER_DEVICE", 5), 1)
+    with transaction.atomic():
+        # Serializes logins of one user so concurrent ones cannot overshoot.
+        User.objects.select_for_update().only("pk").get(pk=user.pk)
+        keys = APIKey.objects.filter(user=user, label=label)
+        active = list(
+            keys.filter(
+                Q(expires_at__isnull=True) | Q(expires_at__gte=timezone.now()),
+                revoked=False,
+            )
+            .order_by("-expires_at")
+            .values_list("prefix", flat=True)[:limit]
+        )
+        keys.exclude(prefix__in=active).delete()
+        if len(active) < limit:
+            APIKey.objects.create(
+                prefix=key.prefix,
+                hashed_key=key.hashed_key,
+                user=user,
+                label=label,
+                expires_at=sliding_expiry(),
+            )
+            return f"{key.prefix}.{key.key}"
+        prefix = active[-1]
+        keys.filter(prefix=prefix).update(
+            hashed_key=key.hashed_key,
+            created_at=timezone.now(),
+            expires_at=sliding_expiry(),
+        )
+        # The old secret may still be cached under the reused prefix.
+        transaction.on_commit(lambda: invalidate_api_key(prefix))
+    return f"{prefix}.{key.key}"
+
+
+def invalidate_api_keys(prefixes: list[str]):
+    for prefix in prefixes:
+        local_keys.delete(prefix)
+    cache.delete_many([CACHE_KEY.format(prefix) for prefix in prefixes])
+    # Local copies elsewhere live at most API_KEY_LOCAL_CACHE_TIMEOUT, and
+    # are not trusted while the marker exists.
+    cache.set_many(
+        {REVOKED_KEY.format(prefix): 1 for prefix in prefixes}, _local_timeout()
+    )
+
+
+def invalidate_api_key(prefix: str):
+    invalidate_api_keys([prefix])
+
+
+async def ainvalidate_api_key(prefix: str):
+    local_keys.delete(prefix)
+    await cache.adelete(CACHE_KEY.format(prefix))
+    await cache.aset(REVOKED_KEY.format(prefix), 1, _local_timeout())
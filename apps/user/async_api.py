@@ -0,0 +1,108 @@
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError
+from django.shortcuts import Http404
+from django.utils import timezone
+from ninja import Router
+from ninja_apikey.models import APIKey
+
+from apps.user.api import SIGNUP_CONFLICTS
+from apps.user.apikeys import ainvalidate_api_key, issue_login_key
+from apps.user.hashing import aauthenticate_user, ahash_password
+from apps.user.models import User
+from apps.user.provisioning import (
+    MAX_PROVISION_ITEMS,
+    duplicate_field,
+    provision_users,
+)
+from apps.user.schema import (
+    Message,
+    UserBulkIn,
+    UserBulkOut,
+    UserIn,
+    UserOut,
+    UserSignIn,
+    UserSignUpOut,
+    UserUpdateIn,
+    UserUpdateOut,
+)
+
+router = Router()
+
+
+@router.post("/", auth=None, response={200: UserSignUpOut, 409: Message})
+async def signup(request, userInfo: UserIn):
+    password = await ahash_password(userInfo.password)
+    try:
+        user = await User.objects.acreate(
+            username=userInfo.username, email=userInfo.email, password=password
+        )
+    except IntegrityError as e:
+        return 409, Message(message=SIGNUP_CONFLICTS[duplicate_field(e)])
+    return UserSignUpOut.from_orm(user)
+
+
+@router.post("/bulk", response={200: UserBulkOut, 400: Message, 403: Message})
+async def provision(request, payload: UserBulkIn):
+    if not request.user.is_staff:
+        return 403, Message(message="Only staff can provision users.")
+    if len(payload.users) > MAX_PROVISION_ITEMS:
+        return 400, Message(message=f"at most {MAX_PROVISION_ITEMS} users per request")
+    results = await sync_to_async(provision_users)(payload.users)
+    return UserBulkOut(results=results)
+
+
+@router.post("/login", auth=None, response={200: UserOut, 401: Message})
+async def login(request, userInfo: UserSignIn):
+    user = await aauthenticate_user(userInfo.username, userInfo.password)
+    if user is None:
+        return 401, Message(message="Unauthorized")
+    # Issuing locks the user's keys in a transaction, which needs the sync ORM.
+    token = await sync_to_async(issue_login_key)(user, userInfo.device)
+    user.last_login = timezone.now()
+    await user.asave(update_fields=["last_login"])
+    return UserOut(
+        id=user.id,
+        token=token,
+        username=user.username,
+        email=user.email,
+    )
+
+
+@router.post("/logout", response={200: Message, 401: Message})
+async def logout(request):
+    if request.user.is_anonymous:
+        return 401, Message(message="unauthorized")
+    user_token = request.headers.get("X-API-Key")
+    if not user_token:
+        return 401, Message(message="No API key provided")
+    data = user_token.split(".")
+    if len(data) < 2:
+        return 401, Message(message="Invalid API key format")
+    prefix = data[0]
+    await APIKey.objects.filter(prefix=prefix).adelete()
+    await ainvalidate_api_key(prefix)
+    return 200, Message(message="successful")
+
+
+@router.patch("/", response={200: UserUpdateOut, 409: Message})
+async def user_update(request, newInfo: UserUpdateIn):
+    try:
+        user = await User.objects.aget(id=request.user.id)
+    except User.DoesNotExist:
+        raise Http404("User not found")
+
+    if newInfo.email is not None:
+        user.email = newInfo.email
+    if newInfo.first_name is not None:
+        user.first_name = newInfo.first_name
+    if newInfo.last_name is not None:
+        user.last_name = newInfo.last_name
+    if newInfo.username is not None:
+        user.username = newInfo.username
+    if newInfo.password is not None:
+        user.password = await ahash_password(newInfo.password)
+    try:
+        await user.asave()
+    except IntegrityError:
+        return 409, Message(message="Username or email already exists.")
+    return UserUpdateOut.from_orm(user)
@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+from apps.user.models import User
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def _apply(fn, items: list) -> list:
+    return [fn(item) for item in items]
+
+
+class HashingPool:
+    """
+    Run password hashing in a bounded process pool, off the web worker.
+
+    In ``process`` mode at most PASSWORD_HASHING_MAX_PENDING jobs (single
+    hashes or chunks of a ``map``) may be queued or running; a caller that
+    cannot get a slot within PASSWORD_HASHING_QUEUE_TIMEOUT seconds gets
+    HashingBusy instead of tying up its worker. ``inline`` mode hashes in
+    the calling thread.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._workers = 0
+        self._lock = threading.Lock()
+
+    def _start(self):
+        with self._lock:
+            if self._executor is None:
+                workers = getattr(settings, "PASSWORD_HASHING_WORKERS", None)
+                workers = workers or os.cpu_count()
+                self._slots = threading.BoundedSemaphore(
+                    getattr(settings, "PASSWORD_HASHING_MAX_PENDING", workers * 4)
+                )
+                # The pool starts lazily from a request thread, and forking a
+                # threaded process can deadlock; forkserver children start clean.
+                self._executor = ProcessPoolExecutor(
+                    workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                    initializer=django.setup,
+                )
+                self._workers = workers
+            return self._executor, self._slots
+
+    def _submit(self, fn, *args):
+        """Queue one job once a slot is free; the slot is released when it ends."""
+        executor, slots = self._start()
+        if not slots.acquire(
+            timeout=getattr(settings, "PASSWORD_HASHING_QUEUE_TIMEOUT", 1)
+        ):
+            raise HashingBusy
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+    def run(self, fn, *args):
+        if getattr(settings, "PASSWORD_HASHING_MODE", "inline") != "process":
+            return fn(*args)
+        return self._submit(fn, *args).result()
+
+    def map(self, fn, items: list) -> list:
+        """
+        Apply ``fn`` to every item across all workers.
+
+        Each chunk takes its own slot, so a large batch queues behind other
+        callers instead of occupying the pool under a single slot.
+        """
+        if getattr(settings, "PASSWORD_HASHING_MODE", "inline") != "process":
+            return _apply(fn, items)
+        self._start()
+        chunksize = max(len(items) // (self._workers * 4), 1)
+        futures = []
+        try:
+            for start in range(0, len(items), chunksize):
+                futures.append(
+                    self._submit(_apply, fn, items[start : start + chunksize])
+                )
+        except HashingBusy:
+            for future in futures:
+                future.cancel()
+            raise
+        return [result for future in futures for result in future.result()]
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._executor = self._slots = None
+
+
+hashing_pool = HashingPool()
+
+
+def hash_password(password: str) -> str:
+    return hashing_pool.run(make_password, password)
+
+
+def hash_passwords(passwords: list[str]) -> list[str]:
+    return hashing_pool.map(make_password, passwords)
+
+
+def _verify_password(password: str, encoded: str) -> tuple[bool, bool]:
+    return hashing_pool.run(verify_password, password, encoded)
+
+
+# Waiting on the pool touches no connection, so it may leave the shared sync
+# thread and let other requests run meanwhile.
+ahash_password = sync_to_async(hash_password, thread_sensitive=False)
+_averify_password = sync_to_async(_verify_password, thread_sensitive=False)
+
+
+def check_user_password(user, password: str) -> bool:
+    """Verify ``password`` and upgrade the stored hash if the hasher changed."""
+    is_correct, must_update = _verify_password(password, user.password)
+    if is_correct and must_update:
+        user.password = hash_password(password)
+        user.save(update_fields=["password"])
+    return is_correct
+
+
+async def acheck_user_password(user, password: str) -> bool:
+    is_correct, must_update = await _averify_password(password, user.password)
+    if is_correct and must_update:
+        user.password = await ahash_password(password)
+        await user.asave(update_fields=["password"])
+    return is_correct
+
+
+def authenticate_user(username: str, password: str):
+    """ModelBackend.authenticate with the hashing done by the pool."""
+    try:
+        user = User._default_manager.get_by_natural_key(username)
+    except User.DoesNotExist:
+        # Hash anyway so the response time does not reveal unknown usernames.
+        hash_password(password)
+        return None
+    if not user.is_active or not check_user_password(user, password):
+        return None
+    return user
+
+
+async def aauthenticate_user(username: str, password: str):
+    try:
+        user = await User._default_manager.aget(**{User.USERNAME_FIELD: username})
+    except User.DoesNotExist:
+        await ahash_password(password)
+        return None
+    if not user.is_active or not await acheck_user_password(user, password):
+        return None
+    return user
@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.hashers import make_password, verify_password
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from apps.user.hashing import HashingPool
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure password verification throughput, the cost that dominates "
+        "login, inline on the request thread and in the hashing process pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=40)
+        parser.add_argument("--workers", type=int, default=2)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument(
+            "--hasher",
+            action="append",
+            dest="hashers",
+            help="Hasher algorithm to compare, e.g. pbkdf2_sha256 or scrypt",
+        )
+
+    def handle(self, *args, **options):
+        for hasher in options["hashers"] or ["pbkdf2_sha256", "scrypt"]:
+            encoded = make_password("bench-password", hasher=hasher)
+            # Inline is one request thread doing its own hashing, one core.
+            rate = self.measure(HashingPool(), encoded, options["logins"], 1)
+            self.report(hasher, "inline", rate, 1)
+            with override_settings(
+                PASSWORD_HASHING_MODE="process",
+                PASSWORD_HASHING_WORKERS=options["workers"],
+                PASSWORD_HASHING_MAX_PENDING=options["concurrency"],
+            ):
+                pool = HashingPool()
+                try:
+                    rate = self.measure(
+                        pool, encoded, options["logins"], options["concurrency"]
+                    )
+                finally:
+                    pool.shutdown()
+            self.report(hasher, "process", rate, options["workers"])
+
+    def measure(self, pool, encoded, logins, concurrency):
+        def login(_):
+            is_correct, _ = pool.run(verify_password, "bench-password", encoded)
+            assert is_correct
+
+        login(None)  # starts the pool outside the timing
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as callers:
+            list(callers.map(login, range(logins)))
+        return logins / (time.perf_counter() - started)
+
+    def report(self, hasher, mode, rate, cores):
+        self.stdout.write(
+            f"{hasher:>14} {mode:>7}: {rate:.1f} logins/s, "
+            f"{rate / cores:.1f} per core ({cores} cores)"
+        )
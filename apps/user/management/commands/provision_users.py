@@ -0,0 +1,48 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+from pydantic import ValidationError
+
+from apps.user.provisioning import MAX_PROVISION_ITEMS, provision_users
+from apps.user.schema import UserIn
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users from a CSV (username,email,password) or NDJSON file, "
+        "hashing passwords in parallel and inserting each batch at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=("csv", "ndjson"), default="csv")
+        parser.add_argument("--batch-size", type=int, default=MAX_PROVISION_ITEMS)
+
+    def read_users(self, lines, format):
+        if format == "csv":
+            rows = csv.DictReader(lines)
+        else:
+            rows = (json.loads(line) for line in lines if line.strip())
+        for number, row in enumerate(rows, start=1):
+            try:
+                yield UserIn(**row)
+            except ValidationError as e:
+                self.stderr.write(f"row {number}: {e.errors()[0]['msg']}")
+
+    def handle(self, *args, **options):
+        created = skipped = 0
+        with open(options["path"], newline="") as lines:
+            users = self.read_users(lines, options["format"])
+            while batch := list(islice(users, options["batch_size"])):
+                for result in provision_users(batch):
+                    if result.status == 201:
+                        created += 1
+                    else:
+                        skipped += 1
+                        self.stderr.write(f"{result.username}: {result.message}")
+                self.stdout.write(f"{created} created, {skipped} skipped")
+        self.stdout.write(
+            self.style.SUCCESS(f"Provisioned {created} users ({skipped} skipped)")
+        )
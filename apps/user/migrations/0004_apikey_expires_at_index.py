@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("user", "0003_alter_user_options_alter_user_managers_and_more"),
+        ("ninja_apikey", "0002_alter_apikey_hashed_key"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS apikey_expires_at_idx "
+            "ON ninja_apikey_apikey (expires_at)",
+            "DROP INDEX CONCURRENTLY IF EXISTS apikey_expires_at_idx",
+        ),
+    ]
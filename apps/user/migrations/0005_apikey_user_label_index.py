@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction.
+    atomic = False
+
+    dependencies = [
+        ("user", "0004_apikey_expires_at_index"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS apikey_user_label_idx "
+            "ON ninja_apikey_apikey (user_id, label, expires_at)",
+            "DROP INDEX CONCURRENTLY IF EXISTS apikey_user_label_idx",
+        ),
+    ]
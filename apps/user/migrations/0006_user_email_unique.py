@@ -0,0 +1,53 @@
+# Generated by Django 5.1.1 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+def check_duplicate_emails(apps, schema_editor):
+    # Picking which account keeps a shared email is not the migration's call,
+    # so stop with the accounts to fix instead of failing on the constraint.
+    User = apps.get_model("user", "User")
+    duplicates = (
+        User.objects.exclude(email="")
+        .values("email")
+        .annotate(count=models.Count("id"))
+        .filter(count__gt=1)
+        .values_list("email", flat=True)
+    )
+    conflicts = {
+        email: list(
+            User.objects.filter(email=email)
+            .order_by("id")
+            .values_list("username", flat=True)
+        )
+        for email in duplicates
+    }
+    if conflicts:
+        raise RuntimeError(
+            "Cannot make user emails unique; these emails are shared by several "
+            "accounts. Change or clear all but one of each, then migrate again:\n"
+            + "\n".join(
+                f"  {email}: {', '.join(usernames)}"
+                for email, usernames in conflicts.items()
+            )
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("auth", "0012_alter_user_first_name_max_length"),
+        ("user", "0005_apikey_user_label_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicate_emails, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="user",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("email", ""), _negated=True),
+                fields=("email",),
+                name="user_email_unique",
+            ),
+        ),
+    ]
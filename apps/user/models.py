@@ -1,5 +1,16 @@
 from django.contrib.auth.models import AbstractUser
+from django.db import models
+
+EMAIL_CONSTRAINT = "user_email_unique"
 
 
 class User(AbstractUser):
-    pass
+    class Meta(AbstractUser.Meta):
+        constraints = [
+            # Lets signup detect a taken email from its INSERT alone.
+            models.UniqueConstraint(
+                fields=["email"],
+                condition=~models.Q(email=""),
+                name=EMAIL_CONSTRAINT,
+            ),
+        ]
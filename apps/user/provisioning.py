@@ -0,0 +1,77 @@
+from django.db import IntegrityError
+
+from apps.user.hashing import hash_passwords
+from apps.user.models import EMAIL_CONSTRAINT, User
+from apps.user.schema import UserBulkResult, UserIn
+
+MAX_PROVISION_ITEMS = 1000
+
+
+def duplicate_field(error: IntegrityError) -> str:
+    """Name the field whose unique constraint rejected an INSERT into users."""
+    diag = getattr(error.__cause__, "diag", None)
+    if getattr(diag, "constraint_name", None) == EMAIL_CONSTRAINT:
+        return "email"
+    return "username"
+
+
+def provision_users(users: list[UserIn]) -> list[UserBulkResult]:
+    """
+    Create many users with one parallel hashing pass and one INSERT.
+
+    Usernames or emails that are taken, or repeated within ``users``, are
+    reported with status 409 instead of failing the batch.
+    """
+    taken_usernames = set(
+        User.objects.filter(username__in=[u.username for u in users]).values_list(
+            "username", flat=True
+        )
+    )
+    taken_emails = set(
+        User.objects.filter(email__in=[u.email for u in users]).values_list(
+            "email", flat=True
+        )
+    )
+    results, new = [], []
+    for item in users:
+        if item.username in taken_usernames:
+            message = "username is already registered."
+        elif item.email in taken_emails:
+            message = "Email address is already registered."
+        else:
+            taken_usernames.add(item.username)
+            taken_emails.add(item.email)
+            new.append(item)
+            message = None
+        results.append(
+            UserBulkResult(
+                username=item.username,
+                status=409 if message else 201,
+                message=message,
+            )
+        )
+
+    passwords = hash_passwords([item.password for item in new])
+    # Conflicts with concurrent signups are skipped and reported below.
+    User.objects.bulk_create(
+        [
+            User(username=item.username, email=item.email, password=password)
+            for item, password in zip(new, passwords)
+        ],
+        ignore_conflicts=True,
+    )
+    emails = {item.username: item.email for item in new}
+    ids = {
+        (username, email): id
+        for username, email, id in User.objects.filter(
+            username__in=emails.keys()
+        ).values_list("username", "email", "id")
+    }
+    for result in results:
+        if result.status != 201:
+            continue
+        result.id = ids.get((result.username, emails[result.username]))
+        if result.id is None:
+            result.status = 409
+            result.message = "username or email is already registered."
+    return results
@@ -1,7 +1,7 @@
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 from ninja import ModelSchema, Schema
-from pydantic import ValidationInfo, field_validator
+from pydantic import Field, ValidationInfo, field_validator
 
 from apps.user.models import User
 
@@ -40,6 +40,7 @@ class UserIn(Schema):
 class UserSignIn(Schema):
     username: str
     password: str
+    device: str = Field("login", min_length=1, max_length=40)
 
 
 class Message(Schema):
@@ -71,3 +72,18 @@ class UserSignUpOut(Schema):
     id: int
     username: str
     email: str
+
+
+class UserBulkIn(Schema):
+    users: list[UserIn]
+
+
+class UserBulkResult(Schema):
+    username: str
+    id: int | None = None
+    status: int
+    message: str | None = None
+
+
+class UserBulkOut(Schema):
+    results: list[UserBulkResult]
@@ -0,0 +1,31 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from ninja_apikey.models import APIKey
+
+from apps.user.apikeys import invalidate_api_key, invalidate_api_keys
+from apps.user.models import User
+
+# Cached keys hold these, so a change to them must drop the user's keys.
+CACHED_USER_FIELDS = {"is_active", "is_staff"}
+
+
+@receiver(post_save, sender=APIKey)
+@receiver(post_delete, sender=APIKey)
+def drop_cached_api_key(sender, instance, **kwargs):
+    # Covers revocation and deletion from the admin, not only logout.
+    invalidate_api_key(instance.prefix)
+
+
+@receiver(post_save, sender=User)
+def drop_cached_user_keys(sender, instance, created, update_fields, **kwargs):
+    if created or (update_fields and not CACHED_USER_FIELDS & set(update_fields)):
+        return
+    prefixes = list(
+        APIKey.objects.filter(user=instance).values_list("prefix", flat=True)
+    )
+    if prefixes:
+        # After commit, so a request in between cannot cache the old state again.
+        transaction.on_commit(partial(invalidate_api_keys, prefixes))
@@ -1,9 +1,30 @@
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+
 import pytest
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
 from django.test.client import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 from ninja_apikey.models import APIKey
-
+from ninja_apikey.security import generate_key
+
+from apps.user.apikeys import (
+    cache_api_key,
+    local_keys,
+    pending_refreshes,
+    sliding_expiry,
+    touch_api_key,
+)
+from apps.user.hashing import HashingBusy, HashingPool, hashing_pool
 from apps.user.models import User
 from apps.user.schema import UserSignIn, UserUpdateIn
+from apps.user.tasks import delete_expired_api_keys, refresh_api_keys
+from todo_app.api import CustomApiKeyAuth
 
 
 @pytest.mark.django_db
@@ -35,6 +56,15 @@ class TestSignupEndpoint:
 
         assert response.status_code == 409
 
+    def test_signup_is_a_single_insert(self, client: Client, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            response = client.post(
+                "/api/users/", self.USER_DATA, content_type="application/json"
+            )
+
+        assert response.status_code == 200
+        assert User.objects.get(username="user1").check_password("1234567890")
+
     def test_username_already_registered(self, client: Client):
         response = client.post(
             "/api/users/", self.USER_DATA, content_type="application/json"
@@ -201,3 +231,430 @@ class TestUpdateEndpoint:
 
         assert response.status_code == 409
         assert response.json() == {"message": "Username or email already exists."}
+
+
+@pytest.mark.django_db
+class TestApiKeyCache:
+    def test_cached_key_skips_key_check(
+        self, rf, user, api_key, django_assert_num_queries
+    ):
+        auth = CustomApiKeyAuth()
+        assert auth.authenticate(rf.get("/"), api_key) == user
+
+        request = rf.get("/")
+        with django_assert_num_queries(0):
+            assert auth.authenticate(request, api_key) == user
+            assert request.user.is_staff == user.is_staff
+        assert request.user == user
+
+    def test_cache_holds_no_user_data(self, rf, user, api_key):
+        CustomApiKeyAuth().authenticate(rf.get("/"), api_key)
+
+        entry = cache.get(f"apikey:{api_key.split('.', maxsplit=1)[0]}")
+
+        assert entry[1] == user.pk
+
+    def test_deactivated_user_is_refused(
+        self, rf, user, api_key, django_capture_on_commit_callbacks
+    ):
+        auth = CustomApiKeyAuth()
+        auth.authenticate(rf.get("/"), api_key)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user.is_active = False
+            user.save()
+
+        assert not auth.authenticate(rf.get("/"), api_key)
+
+    def test_login_keeps_cached_keys(
+        self, rf, user, api_key, django_capture_on_commit_callbacks
+    ):
+        CustomApiKeyAuth().authenticate(rf.get("/"), api_key)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            user.last_login = timezone.now()
+            user.save(update_fields=["last_login"])
+
+        assert cache.get(f"apikey:{api_key.split('.', maxsplit=1)[0]}")
+
+    def test_wrong_secret_is_not_served_from_cache(self, rf, user, api_key):
+        auth = CustomApiKeyAuth()
+        auth.authenticate(rf.get("/"), api_key)
+        prefix = api_key.split(".", maxsplit=1)[0]
+
+        assert not auth.authenticate(rf.get("/"), f"{prefix}.wrongsecret")
+
+    def test_logout_invalidates_cached_key(self, client: Client, user, api_key):
+        headers = {"X-API-Key": api_key}
+        assert client.get("/api/todos/", headers=headers).status_code == 200
+
+        client.post("/api/users/logout", headers=headers)
+
+        assert client.get("/api/todos/", headers=headers).status_code == 401
+
+    def test_logout_reaches_other_processes(self, client: Client, user, api_key):
+        headers = {"X-API-Key": api_key}
+        prefix = api_key.split(".", maxsplit=1)[0]
+        assert client.get("/api/todos/", headers=headers).status_code == 200
+        entry = local_keys.get(prefix)
+
+        client.post("/api/users/logout", headers=headers)
+        # As if another process had taken its local copy before the logout.
+        local_keys.set(prefix, entry, 5)
+
+        assert client.get("/api/todos/", headers=headers).status_code == 401
+
+    def test_logout_of_already_deleted_key(self, client: Client, user, api_key):
+        headers = {"X-API-Key": api_key}
+        APIKey.objects.filter(prefix=api_key.split(".", maxsplit=1)[0]).delete()
+        # As if another process still had the deleted key cached.
+        cache_api_key(api_key, user, sliding_expiry())
+
+        response = client.post("/api/users/logout", headers=headers)
+
+        assert response.status_code == 200
+
+    def test_revoked_key_is_invalidated(self, rf, user, api_key):
+        auth = CustomApiKeyAuth()
+        auth.authenticate(rf.get("/"), api_key)
+
+        key = APIKey.objects.get(prefix=api_key.split(".", maxsplit=1)[0])
+        key.revoked = True
+        key.save()
+
+        assert not auth.authenticate(rf.get("/"), api_key)
+
+
+@pytest.mark.django_db
+class TestApiKeyRefresh:
+    @pytest.fixture
+    def stale_key(self, api_key):
+        prefix = api_key.split(".", maxsplit=1)[0]
+        APIKey.objects.filter(prefix=prefix).update(
+            expires_at=timezone.now() + timedelta(days=1)
+        )
+        return prefix
+
+    def expires_at(self, prefix):
+        return APIKey.objects.get(prefix=prefix).expires_at
+
+    def test_refresh_is_coalesced(self, settings, stale_key, django_assert_num_queries):
+        settings.API_KEY_REFRESH_BATCH_SIZE = 1
+
+        with django_assert_num_queries(1):
+            touch_api_key(stale_key)
+        with django_assert_num_queries(0):
+            touch_api_key(stale_key)
+
+        assert self.expires_at(stale_key) > timezone.now() + timedelta(days=9)
+
+    def test_refreshes_are_batched(self, settings, user, stale_key):
+        settings.API_KEY_REFRESH_BATCH_SIZE = 2
+        other = generate_key()
+        APIKey.objects.create(
+            prefix=other.prefix, user=user, hashed_key=other.hashed_key, label="test"
+        )
+
+        touch_api_key(stale_key)
+        assert self.expires_at(stale_key) < timezone.now() + timedelta(days=2)
+
+        with CaptureQueriesContext(connection) as queries:
+            touch_api_key(other.prefix)
+
+        assert len(queries) == 1
+        assert self.expires_at(stale_key) > timezone.now() + timedelta(days=9)
+        assert self.expires_at(other.prefix) > timezone.now() + timedelta(days=9)
+
+    def test_overdue_buffer_is_flushed_by_any_request(self, settings, stale_key):
+        settings.API_KEY_REFRESH_BATCH_SIZE = 100
+        settings.API_KEY_REFRESH_INTERVAL = 60
+        touch_api_key(stale_key)
+        touch_api_key(stale_key)
+        assert self.expires_at(stale_key) < timezone.now() + timedelta(days=2)
+
+        pending_refreshes._since -= 61
+        touch_api_key(stale_key)
+
+        assert self.expires_at(stale_key) > timezone.now() + timedelta(days=9)
+
+    def test_celery_mode_hands_batch_to_task(self, settings, stale_key, monkeypatch):
+        settings.API_KEY_REFRESH_BATCH_SIZE = 1
+        settings.API_KEY_REFRESH_MODE = "celery"
+        delayed = []
+        monkeypatch.setattr(refresh_api_keys, "delay", delayed.append)
+
+        touch_api_key(stale_key)
+
+        assert delayed == [[stale_key]]
+        assert refresh_api_keys(delayed[0]) == 1
+
+
+@pytest.mark.django_db
+class TestDeleteExpiredApiKeys:
+    @pytest.fixture
+    def keys(self, user):
+        now = timezone.now()
+        for days in (-3, -2, -1, 1):
+            key = generate_key()
+            APIKey.objects.create(
+                prefix=key.prefix,
+                user=user,
+                hashed_key=key.hashed_key,
+                label="test",
+                expires_at=now + timedelta(days=days),
+            )
+
+    def test_deletes_expired_in_batches(self, keys, monkeypatch):
+        resumed = []
+        monkeypatch.setattr(
+            delete_expired_api_keys, "apply_async", lambda **kw: resumed.append(kw)
+        )
+
+        assert delete_expired_api_keys(batch_size=2) == 3
+
+        assert APIKey.objects.count() == 1
+        assert APIKey.objects.get().expires_at > timezone.now()
+        assert resumed == []
+
+    def test_resumes_when_batches_run_out(self, keys, monkeypatch):
+        resumed = []
+        monkeypatch.setattr(
+            delete_expired_api_keys, "apply_async", lambda **kw: resumed.append(kw)
+        )
+
+        assert delete_expired_api_keys(batch_size=1, max_batches=2) == 2
+
+        assert APIKey.objects.count() == 2
+        assert resumed == [{"kwargs": {"batch_size": 1, "max_batches": 2}}]
+
+
+@pytest.mark.django_db(transaction=True)
+class TestAsyncUserApi:
+    def test_signup_login_logout(self, client: Client):
+        signup = client.post(
+            "/api/async/users/",
+            {"username": "async", "email": "async@example.com", "password": "12345678"},
+            content_type="application/json",
+        )
+        login = client.post(
+            "/api/async/users/login",
+            {"username": "async", "password": "12345678"},
+            content_type="application/json",
+        )
+        token = login.json()["token"]
+        logout = client.post("/api/async/users/logout", headers={"X-API-Key": token})
+        after = client.post("/api/async/users/logout", headers={"X-API-Key": token})
+
+        assert signup.status_code == 200
+        assert User.objects.get(username="async").check_password("12345678")
+        assert logout.json() == {"message": "successful"}
+        assert after.status_code == 401
+
+    def test_update_password(self, client: Client, user, api_key):
+        response = client.patch(
+            "/api/async/users/",
+            {"password": "new-password"},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+        user.refresh_from_db()
+        assert response.status_code == 200
+        assert user.check_password("new-password")
+
+
+@pytest.mark.django_db
+class TestLoginKeyRotation:
+    def login(self, client: Client, device="login"):
+        response = client.post(
+            "/api/users/login",
+            {"username": "user", "password": "12345678", "device": device},
+            content_type="application/json",
+        )
+        return response.json()["token"]
+
+    def authenticated(self, client: Client, token):
+        response = client.get("/api/todos/", headers={"X-API-Key": token})
+        return response.status_code == 200
+
+    def test_keys_per_device_are_bounded(self, client: Client, user, settings):
+        settings.API_KEY_MAX_PER_DEVICE = 2
+        tokens = [self.login(client) for _ in range(5)]
+        self.login(client, device="laptop")
+
+        assert APIKey.objects.filter(user=user, label="login").count() == 2
+        assert APIKey.objects.filter(user=user, label="laptop").count() == 1
+        assert self.authenticated(client, tokens[-1])
+        assert self.authenticated(client, tokens[-2])
+
+    def test_rotated_key_stops_authenticating(
+        self, client: Client, user, settings, django_capture_on_commit_callbacks
+    ):
+        settings.API_KEY_MAX_PER_DEVICE = 1
+        old = self.login(client)
+        assert self.authenticated(client, old)
+
+        with django_capture_on_commit_callbacks(execute=True):
+            new = self.login(client)
+
+        assert old.split(".")[0] == new.split(".")[0]
+        assert not self.authenticated(client, old)
+        assert self.authenticated(client, new)
+
+    def test_expired_keys_are_removed(self, client: Client, user, api_key):
+        APIKey.objects.filter(user=user).update(
+            label="login", expires_at=timezone.now() - timedelta(days=1)
+        )
+
+        token = self.login(client)
+
+        assert list(
+            APIKey.objects.filter(user=user).values_list("prefix", flat=True)
+        ) == [token.split(".")[0]]
+
+    def test_new_mode_always_inserts(self, client: Client, user, settings):
+        settings.API_KEY_LOGIN_MODE = "new"
+        settings.API_KEY_MAX_PER_DEVICE = 1
+        self.login(client)
+        self.login(client)
+
+        assert APIKey.objects.filter(user=user).count() == 2
+
+
+@pytest.mark.django_db
+class TestPasswordHashing:
+    def login(self, client: Client, username="user"):
+        return client.post(
+            "/api/users/login",
+            {"username": username, "password": "12345678"},
+            content_type="application/json",
+        )
+
+    def test_process_pool_hashes_and_applies_backpressure(self, settings):
+        settings.PASSWORD_HASHING_MODE = "process"
+        settings.PASSWORD_HASHING_WORKERS = 1
+        settings.PASSWORD_HASHING_MAX_PENDING = 1
+        settings.PASSWORD_HASHING_QUEUE_TIMEOUT = 0
+        pool = HashingPool()
+        try:
+            assert pool.run(len, "12345678") == 8
+            executor, slots = pool._start()
+            assert executor._mp_context.get_start_method() == "forkserver"
+            slots.acquire()
+            with pytest.raises(HashingBusy):
+                pool.run(len, "12345678")
+        finally:
+            pool.shutdown()
+
+    def test_map_takes_a_slot_per_chunk(self, settings):
+        settings.PASSWORD_HASHING_MODE = "process"
+        settings.PASSWORD_HASHING_WORKERS = 1
+        settings.PASSWORD_HASHING_MAX_PENDING = 2
+        settings.PASSWORD_HASHING_QUEUE_TIMEOUT = 5
+        pool = HashingPool()
+        try:
+            # Three chunks share two slots, each waiting for a finished one.
+            assert pool.map(len, ["a", "bb", "ccc"]) == [1, 2, 3]
+            settings.PASSWORD_HASHING_QUEUE_TIMEOUT = 0
+            _, slots = pool._start()
+            slots.acquire()
+            # Only one slot is left, but the batch splits into four chunks.
+            with pytest.raises(HashingBusy):
+                pool.map(len, ["a", "bb", "ccc", "dddd"])
+        finally:
+            pool.shutdown()
+
+    def test_busy_pool_returns_503(self, client: Client, user, monkeypatch):
+        def busy(*args):
+            raise HashingBusy
+
+        monkeypatch.setattr(hashing_pool, "run", busy)
+
+        response = self.login(client)
+
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+
+    def test_login_rehashes_with_preferred_hasher(self, client: Client, user, settings):
+        settings.PASSWORD_HASHERS = [
+            "django.contrib.auth.hashers.ScryptPasswordHasher",
+            "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+        ]
+
+        response = self.login(client)
+
+        user.refresh_from_db()
+        assert response.status_code == 200
+        assert user.password.startswith("scrypt$")
+        assert self.login(client).status_code == 200
+
+    def test_unknown_user(self, client: Client, user):
+        assert self.login(client, username="nobody").status_code == 401
+
+
+@pytest.mark.django_db
+class TestEmailUniqueMigration:
+    def test_reports_duplicate_emails(self, user):
+        migration = import_module("apps.user.migrations.0006_user_email_unique")
+        with connection.cursor() as cursor:
+            cursor.execute("DROP INDEX user_email_unique")
+        User.objects.create_user(username="twin", email=user.email)
+        User.objects.create_user(username="blank")
+        User.objects.create_user(username="blank2")
+
+        with pytest.raises(RuntimeError, match="useremail@example.com: user, twin"):
+            migration.check_duplicate_emails(django_apps, None)
+
+
+@pytest.mark.django_db
+class TestProvisionUsers:
+    def post(self, client: Client, api_key, users):
+        return client.post(
+            "/api/users/bulk",
+            {"users": users},
+            headers={"X-API-Key": api_key},
+            content_type="application/json",
+        )
+
+    def new_user(self, name):
+        return {
+            "username": name,
+            "email": f"{name}@example.com",
+            "password": "12345678",
+        }
+
+    def test_provisions_and_reports_conflicts(self, client: Client, user, api_key):
+        User.objects.filter(id=user.id).update(is_staff=True)
+        users = [self.new_user("ann"), self.new_user("bob"), self.new_user("ann")]
+        users.append({**self.new_user("eve"), "email": user.email})
+
+        response = self.post(client, api_key, users)
+
+        statuses = [result["status"] for result in response.json()["results"]]
+        assert statuses == [201, 201, 409, 409]
+        assert User.objects.get(username="bob").check_password("12345678")
+        assert (
+            response.json()["results"][0]["id"] == User.objects.get(username="ann").id
+        )
+
+    def test_requires_staff(self, client: Client, user, api_key):
+        response = self.post(client, api_key, [self.new_user("ann")])
+
+        assert response.status_code == 403
+        assert not User.objects.filter(username="ann").exists()
+
+    def test_command(self, user, tmp_path):
+        path = tmp_path / "users.csv"
+        path.write_text(
+            "username,email,password\n"
+            "ann,ann@example.com,12345678\n"
+            "bob,bob@example.com,short\n"
+            "user,other@example.com,12345678\n"
+        )
+        out, err = StringIO(), StringIO()
+
+        call_command("provision_users", str(path), stdout=out, stderr=err)
+
+        assert "Provisioned 1 users (1 skipped)" in out.getvalue()
+        assert "row 2" in err.getvalue()
+        assert User.objects.filter(username="ann").exists()
@@ -1,11 +1,29 @@
 import pytest
+from django.core.cache import cache
 from ninja_apikey.models import APIKey
 from ninja_apikey.security import generate_key
 
+from apps.todo.hashtag_ids import local_ids
 from apps.todo.models import Todo
+from apps.user.apikeys import local_keys, pending_refreshes
 from apps.user.models import User
 
 
+@pytest.fixture(autouse=True)
+def locmem_cache(settings):
+    settings.CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "OPTIONS": {"MAX_ENTRIES": 1000},
+        }
+    }
+    yield
+    cache.clear()
+    local_keys.clear()
+    local_ids.clear()
+    pending_refreshes.drain()
+
+
 @pytest.fixture
 def user():
     return User.objects.create_user(
@@ -1,34 +1,70 @@
-from datetime import timedelta
-
-from django.conf import settings
-from django.utils import timezone
+from asgiref.sync import sync_to_async
 from ninja import NinjaAPI
-from ninja_apikey.models import APIKey
-from ninja_apikey.security import APIKeyAuth
+from ninja_apikey.security import APIKeyAuth, check_apikey
 
 from apps.todo.api import router as todo_router
+from apps.todo.async_api import router as async_todo_router
 from apps.user.api import router as user_router
+from apps.user.apikeys import (
+    acache_api_key,
+    aget_cached_user,
+    atouch_api_key,
+    cache_api_key,
+    get_cached_user,
+    sliding_expiry,
+    touch_api_key,
+)
+from apps.user.async_api import router as async_user_router
+from apps.user.hashing import HashingBusy
 
 
 class CustomApiKeyAuth(APIKeyAuth):
     def authenticate(self, request, key):
-        user = super().authenticate(request, key)
-        if user:
-            api_key = key.split(".")
-            prefix = api_key[0]
-            try:
-                user_api_key = APIKey.objects.get(prefix=prefix)
-                expiration_days = getattr(settings, "API_KEY_EXPIRATION_DAYS", 30)
-                user_api_key.expires_at = timezone.now() + timedelta(
-                    days=expiration_days
-                )
-                user_api_key.save()
-            except (APIKey.DoesNotExist, ValueError):
-                return False
+        user = get_cached_user(key) if key else None
+        if not user:
+            user = super().authenticate(request, key)
+            if not user:
+                return user
+            cache_api_key(key, user, sliding_expiry())
+        request.user = user
+        touch_api_key(key.split(".")[0])
+        return user
+
+
+class AsyncCustomApiKeyAuth(CustomApiKeyAuth):
+    # Tells ninja to await the callback instead of running it in a thread.
+    is_async = True
+
+    async def authenticate(self, request, key):
+        user = await aget_cached_user(key) if key else None
+        if not user:
+            # Only a cache miss pays for the sync lookup and key hashing.
+            user = await sync_to_async(check_apikey)(key)
+            if not user:
+                return user
+            await acache_api_key(key, user, sliding_expiry())
+        request.user = user
+        await atouch_api_key(key.split(".")[0])
         return user
 
 
+def hashing_busy(request, exc):
+    response = api.create_response(
+        request, {"message": "Too many logins, retry shortly"}, status=503
+    )
+    response.headers["Retry-After"] = "1"
+    return response
+
+
 api = NinjaAPI(auth=CustomApiKeyAuth())
 
 api.add_router("/todos/", todo_router)
 api.add_router("/users/", user_router)
+api.add_exception_handler(HashingBusy, hashing_busy)
+
+# The same endpoints as native coroutines, for ASGI workers.
+async_api = NinjaAPI(auth=AsyncCustomApiKeyAuth(), urls_namespace="async_api")
+
+async_api.add_router("/todos/", async_todo_router)
+async_api.add_router("/users/", async_user_router)
+async_api.add_exception_handler(HashingBusy, hashing_busy)
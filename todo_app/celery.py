@@ -16,7 +16,11 @@ app.autodiscover_tasks()
 
 app.conf.beat_schedule = {
     "delete-expired-api-keys": {
-        "task": "user.tasks.delete-expired-api-keys",
+        "task": "apps.user.tasks.delete_expired_api_keys",
         "schedule": crontab(hour=0, minute=0),
     },
+    "delete-orphan-hashtags": {
+        "task": "apps.todo.tasks.delete_orphan_hashtags",
+        "schedule": crontab(hour=0, minute=30),
+    },
 }
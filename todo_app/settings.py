@@ -38,6 +38,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "django_extensions",
     "ninja_apikey",
     "corsheaders",
@@ -110,6 +111,27 @@ if os.environ.get("TESTING"):
         "PASSWORD": "postgres",
     }
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Production Redis should run with a maxmemory limit and an allkeys-lru policy.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": "redis://localhost:6379/1",
+        "TIMEOUT": 300,
+    }
+}
+
+if os.environ.get("TESTING"):
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    }
+
+TODO_CACHE_TIMEOUT = 60
+TODO_CACHE_MAX_BYTES = 512 * 1024
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 AUTH_USER_MODEL = "user.User"
@@ -128,6 +150,18 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# PASSWORD_HASHER=scrypt makes new hashes use scrypt, which is memory-hard and
+# cheaper per login than PBKDF2; existing hashes are upgraded on next login.
+PASSWORD_HASHERS = [
+    "django.contrib.auth.hashers.PBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+if os.environ.get("PASSWORD_HASHER") == "scrypt":
+    PASSWORD_HASHERS.insert(0, PASSWORD_HASHERS.pop())
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
@@ -158,7 +192,33 @@ STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+# "process" hashes passwords in a pool of PASSWORD_HASHING_WORKERS processes
+# (default: one per core); logins that wait longer than the queue timeout for
+# one of PASSWORD_HASHING_MAX_PENDING slots get a 503.
+PASSWORD_HASHING_MODE = "inline"
+PASSWORD_HASHING_WORKERS = None
+PASSWORD_HASHING_MAX_PENDING = 4 * (os.cpu_count() or 1)
+PASSWORD_HASHING_QUEUE_TIMEOUT = 1
+
 API_KEY_EXPIRATION_DAYS = 10
+# Sliding expiry is extended at most once per interval (seconds) per key and
+# written in batches; "celery" hands the batched UPDATE to a worker.
+API_KEY_REFRESH_INTERVAL = 60
+API_KEY_REFRESH_BATCH_SIZE = 100
+API_KEY_REFRESH_MODE = "inline"
+# "rotate" keeps at most API_KEY_MAX_PER_DEVICE active login keys per user and
+# device label, re-keying the oldest; "new" inserts a key on every login.
+API_KEY_LOGIN_MODE = "rotate"
+API_KEY_MAX_PER_DEVICE = 5
+
+# Hashtag name -> id lookups are cached per process (briefly, since deletes
+# elsewhere only clear the shared cache) and in the shared cache.
+HASHTAG_LOCAL_CACHE_SIZE = 4096
+HASHTAG_LOCAL_CACHE_TIMEOUT = 60
+HASHTAG_CACHE_TIMEOUT = 3600
+
+TODO_EXPORT_ROOT = BASE_DIR / "exports"
+TODO_IMPORT_ROOT = BASE_DIR / "imports"
 
 LOGGING = {
     "version": 1,
@@ -1,9 +1,10 @@
 from django.contrib import admin
 from django.urls import path
 
-from .api import api
+from .api import api, async_api
 
 urlpatterns = [
     path("admin/", admin.site.urls),
+    path("api/async/", async_api.urls),
     path("api/", api.urls),
 ]